@@ -18,3 +18,59 @@ ROBOFLOW_MODEL = "indoor-map/21"
 DEBUG = True
 DETAIL_DEBUG = False
 PATH_DEBUG = True
+
+# Path search engine used when a request does not pass "engine"
+DEFAULT_PATH_ENGINE = "grid"
+
+# Route rendering used when a request does not pass "output": "image" draws
+# on the floor plan and uploads it to S3, overlays and "polyline" do not
+DEFAULT_PATH_OUTPUT = "image"
+
+# Floor images are also served as a tile pyramid of this tile size and
+# format ("webp" or "jpg"); routes can be rendered on just the tiles they cross
+TILE_SIZE = int(os.getenv("TILE_SIZE", 512))
+TILE_FORMAT = os.getenv("TILE_FORMAT", "webp")
+TILE_QUALITY = 80
+
+# Persistent numba compilation cache shared by web and Celery workers
+NUMBA_CACHE_DIR = os.getenv("NUMBA_CACHE_DIR", "/tmp/pathfinder-numba-cache")
+
+# Cluster edge length (pixels) of the HPA* abstraction
+HPA_CLUSTER_SIZE = 64
+
+# Coarse-to-fine routing: coarse map size (% of the original) and corridor
+# half-width around the coarse path, in coarse cells
+MULTIRES_SCALE_PERCENT = 25
+MULTIRES_CORRIDOR = 2
+
+# Endpoints on a wall move to the nearest walkable pixel within this many
+# pixels; requests may lower or raise it with "snap_radius"
+SNAP_RADIUS = int(os.getenv("SNAP_RADIUS", 25))
+
+# Routes are returned and stored as polylines that stay within this many
+# pixels of the computed path
+PATH_SIMPLIFY_TOLERANCE = float(os.getenv("PATH_SIMPLIFY_TOLERANCE", 1.0))
+
+# Landmarks per image for the ALT A* heuristic; each one stores a uint16
+# distance per pixel, so a 2000x3000 floor plan holds about 96MB of tables
+ALT_LANDMARKS = 8
+
+# Byte budget of the per-worker LRU cache of decoded images and routing
+# structures
+ROUTING_CACHE_BYTES = int(os.getenv("ROUTING_CACHE_BYTES", 512 * 1024 * 1024))
+# Larger values are not cached, so one big table (e.g. ALT landmarks) cannot
+# evict everything else; memory-mapped ones are reopened from disk instead
+ROUTING_CACHE_ENTRY_BYTES = int(
+    os.getenv("ROUTING_CACHE_ENTRY_BYTES", ROUTING_CACHE_BYTES // 4)
+)
+
+# Local directory of memory-mapped routing arrays, one folder per image
+# version, shared by every worker on the host
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "/tmp/pathfinder-artifacts")
+
+# /image/<image_id> streams its anchor list above this many anchors
+ANCHOR_STREAM_THRESHOLD = 500
+
+# Users resolved from auth tokens are reused for this many seconds
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_CACHE_SIZE = 1024
@@ -4,6 +4,7 @@ from celery import Celery
 from flask import Flask
 from flaskConfig import Config
 from flask_cors import CORS
+from pathCalculator.search import warmup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -80,3 +81,4 @@ def create_app():
 
 app = create_app()
 celery = make_celery(app)
+warmup()
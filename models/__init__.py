@@ -4,5 +4,6 @@ from .imageModel import Image
 from .anchorModel import Anchor, Tag
 from .requestModel import Request
 from .pathModel import Path
+from .artifactModel import RoutingArtifact
 
-__all__ = ["Building", "User", "Anchor", "Image", "Request", "Tag"]
+__all__ = ["Building", "User", "Anchor", "Image", "Request", "Tag", "RoutingArtifact"]
@@ -43,6 +43,21 @@ class Anchor(Document):
     )  # Set default value to an empty list
     tagData = ListField(EmbeddedDocumentField(Tag), default=list)
 
+    # Roboflow detections are unique per image, so re-running saveData for
+    # an image cannot duplicate them; anchors without a detectionId are not
+    # constrained. Existing duplicates block the index: run
+    # utils.migrate_binary_images, which removes them, before deploying
+    meta = {
+        "indexes": [
+            "image",
+            {
+                "fields": ["image", "detectionId"],
+                "unique": True,
+                "partialFilterExpression": {"detectionId": {"$type": "string"}},
+            },
+        ]
+    }
+
     def save(self, *args, **kwargs):
         if not self.createdAt:
             self.createdAt = datetime.now(timezone.utc)
@@ -68,3 +83,28 @@ class Anchor(Document):
             "createdAt": self.createdAt.isoformat() if self.createdAt else None,
             "updatedAt": self.updatedAt.isoformat() if self.updatedAt else None,
         }
+
+    @staticmethod
+    def raw_dict(document):
+        # to_dict for a raw document from as_pymongo(): no Document objects
+        # are built and the image reference is not dereferenced
+        created = document.get("createdAt")
+        updated = document.get("updatedAt")
+        return {
+            "id": str(document["_id"]),
+            "image": str(document["image"]) if document.get("image") else None,
+            "tags": document.get("tags", []),
+            "tagData": document.get("tagData", []),
+            "x": document.get("x"),
+            "y": document.get("y"),
+            "width": document.get("width"),
+            "height": document.get("height"),
+            "confidence": document.get("confidence"),
+            "classType": document.get("classType"),
+            "classId": document.get("classId"),
+            "label": document.get("label"),
+            "detectionId": document.get("detectionId"),
+            "metadata": document.get("metadata", {}),
+            "createdAt": created.isoformat() if created else None,
+            "updatedAt": updated.isoformat() if updated else None,
+        }
@@ -0,0 +1,40 @@
+from mongoengine import (
+    Document,
+    StringField,
+    ReferenceField,
+    DictField,
+    FileField,
+    DateTimeField,
+)
+from datetime import datetime, timezone
+from models import Image
+
+
+# Precomputed routing data for an image (HPA graph, landmarks, ...), stored
+# as compressed numpy arrays in GridFS so it is not bound by the 16MB limit
+class RoutingArtifact(Document):
+    image = ReferenceField(Image, required=True)
+    kind = StringField(required=True, max_length=100)
+    params = DictField()
+    data = FileField(collection_name="routing_artifacts")
+    createdAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    updatedAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {"indexes": [{"fields": ["image", "kind"], "unique": True}]}
+
+    def save(self, *args, **kwargs):
+        if not self.createdAt:
+            self.createdAt = datetime.now(timezone.utc)
+        self.updatedAt = datetime.now(timezone.utc)
+        return super(RoutingArtifact, self).save(*args, **kwargs)
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "image": str(self.image.id) if self.image else None,
+            "kind": self.kind,
+            "params": self.params,
+            "size": self.data.length if self.data else 0,
+            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
+            "updatedAt": self.updatedAt.isoformat() if self.updatedAt else None,
+        }
@@ -1,5 +1,8 @@
+import base64
+
 from mongoengine import (
     Document,
+    QuerySet,
     EmbeddedDocument,
     StringField,
     ReferenceField,
@@ -9,11 +12,23 @@ from mongoengine import (
     ListField,
     IntField,
     BinaryField,
+    FileField,
 )
 from datetime import datetime, timezone
 from models import Building
 
 
+# Per-pixel payloads: list endpoints never fetch them
+HEAVY_FIELDS = ("binary_packed", "binary_image", "image_binary")
+
+
+class ImageQuerySet(QuerySet):
+    def light(self):
+        # Metadata only: the map is not loaded, so has_binary_image() and
+        # to_dict(full=True) do not apply to these documents
+        return self.exclude(*HEAVY_FIELDS)
+
+
 # Define the User model (Document)
 class Image(Document):
     building = ReferenceField(Building, required=True)
@@ -25,11 +40,24 @@ class Image(Document):
     floor = IntField(required=True)
     imageWidth = IntField(default=None, required=False)
     imageHeight = IntField(default=None, required=False)
-    image_binary = BinaryField(required=False)
+    # Decoded BGR frame as PNG in GridFS, read only when a path is drawn;
+    # image_shape is its array shape
+    image_file = FileField(collection_name="image_files")
     image_shape = ListField(IntField(), required=False)
+    # Legacy raw frame bytes, see utils/migrate_binary_images.py
+    image_binary = BinaryField(required=False)
     createdAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
     updatedAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    # Thresholded floor plan, one bit per pixel (encode_binary_image)
+    binary_packed = BinaryField(required=False)
+    binary_shape = ListField(IntField(), required=False)
+    # Legacy nested lists, see utils/migrate_binary_images.py
     binary_image = ListField()
+    # Tile pyramid manifest written by build_image_tiles: url prefix, source
+    # version, tile_size, format and the (height, width) of every level
+    tiles = DictField()
+
+    meta = {"queryset_class": ImageQuerySet}
 
     def save(self, *args, **kwargs):
         if not self.createdAt:
@@ -37,19 +65,28 @@ class Image(Document):
         self.updatedAt = datetime.now(timezone.utc)
         return super(Image, self).save(*args, **kwargs)
 
-    def to_dict(self):
-        return {
-            "id": str(self.id),
-            "building": self.building.to_dict(),
-            "type": self.type,
-            "url": self.url,
-            "floor": self.floor,
-            "imageWidth": self.imageWidth,
-            "imageHeight": self.imageHeight,
-            "binary_image": self.binary_image,
-            "createdAt": self.createdAt.isoformat(),
-            "updatedAt": self.updatedAt.isoformat(),
-        }
+    def has_binary_image(self):
+        return bool(self.binary_packed or self.binary_image)
+
+    def delete_files(self):
+        # GridFS files are not removed with the document
+        if self.image_file:
+            self.image_file.delete()
+
+    def to_dict(self, full=False, building=None):
+        # building: the image's Building when the caller already has it,
+        # which saves dereferencing it per image
+        data = self.simple_dict()
+        data["building"] = (building or self.building).to_dict()
+        if full:
+            data["binary_shape"] = self.binary_shape
+            data["binary_packed"] = (
+                base64.b64encode(self.binary_packed).decode()
+                if self.binary_packed
+                else None
+            )
+            data["binary_image"] = self.binary_image
+        return data
 
     def simple_dict(self):
         return {
@@ -59,6 +96,7 @@ class Image(Document):
             "floor": self.floor,
             "imageWidth": self.imageWidth,
             "imageHeight": self.imageHeight,
+            "tiles": self.tiles or None,
             "createdAt": self.createdAt.isoformat(),
             "updatedAt": self.updatedAt.isoformat(),
         }
@@ -20,6 +20,10 @@ class Path(Document):
     url = StringField(required=False, max_length=200)
     start = ListField(IntField(), required=True)
     end = ListField(IntField(), required=True)
+    # Cache key (image version, snapped endpoints, engine and options) and the
+    # simplified route as an encoded polyline of (row, col) points
+    key = StringField(max_length=40)
+    polyline = StringField()
     createdAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
     updatedAt = DateTimeField(default=lambda: datetime.now(timezone.utc))
     expireAt = DateTimeField(
@@ -32,7 +36,12 @@ class Path(Document):
         self.updatedAt = datetime.now(timezone.utc)
         return super(Path, self).save(*args, **kwargs)
 
-    meta = {"indexes": [{"fields": ["expireAt"], "expireAfterSeconds": 0}]}
+    meta = {
+        "indexes": [
+            {"fields": ["expireAt"], "expireAfterSeconds": 0},
+            ("image", "key"),
+        ]
+    }
 
     def to_dict(self):
         return {
@@ -44,6 +53,7 @@ class Path(Document):
             "url": self.url,  # Serialize the URL
             "start": self.start,  # Serialize the start point list
             "end": self.end,  # Serialize the end point list
+            "polyline": self.polyline,
             "createdAt": (
                 self.createdAt.isoformat() if self.createdAt else None
             ),  # Serialize datetime
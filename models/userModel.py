@@ -10,6 +10,11 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 
 
+# Called with the user id after a user is saved or deleted, e.g. to drop
+# cached copies. Updates through User.objects(...).update() bypass them.
+USER_CHANGE_HOOKS = []
+
+
 # Define the User model (Document)
 class User(Document):
     username = StringField(required=True, max_length=50)
@@ -30,4 +35,14 @@ class User(Document):
         if not self.createdAt:
             self.createdAt = datetime.now(timezone.utc)
         self.updatedAt = datetime.now(timezone.utc)
-        return super(User, self).save(*args, **kwargs)
+        result = super(User, self).save(*args, **kwargs)
+        self.notify_change()
+        return result
+
+    def delete(self, *args, **kwargs):
+        super(User, self).delete(*args, **kwargs)
+        self.notify_change()
+
+    def notify_change(self):
+        for hook in USER_CHANGE_HOOKS:
+            hook(str(self.id))
@@ -1,5 +1,35 @@
 from .graph_utils import create_graph, shortest_path
+from .grid_search import grid_astar
+from .jps import jps_path, jps_plus_path, build_jump_table
+from .hpa import hpa_path, build_hpa
+from .multires import multires_path
+from .skeleton import skeleton_path, build_skeleton_graph
+from .landmarks import alt_path, build_landmarks
+from .ch import ch_path, build_contraction_hierarchy
+from .search import find_path, PATH_ENGINES
 from .image_processing import read_image, convert_to_grayscale, apply_threshold
 from .visualization import visualize_path
 
-__all__ = ["create_graph", "shortest_path", "read_image", "convert_to_grayscale", "apply_threshold", "visualize_path"]
\ No newline at end of file
+__all__ = [
+    "create_graph",
+    "shortest_path",
+    "grid_astar",
+    "jps_path",
+    "jps_plus_path",
+    "build_jump_table",
+    "hpa_path",
+    "build_hpa",
+    "multires_path",
+    "skeleton_path",
+    "build_skeleton_graph",
+    "alt_path",
+    "build_landmarks",
+    "ch_path",
+    "build_contraction_hierarchy",
+    "find_path",
+    "PATH_ENGINES",
+    "read_image",
+    "convert_to_grayscale",
+    "apply_threshold",
+    "visualize_path",
+]
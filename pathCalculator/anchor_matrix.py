@@ -0,0 +1,72 @@
+import numpy as np
+from services import path_logs
+from .grid_search import to_walkable
+from .kernels import njit, bfs_kernel
+
+
+@njit(cache=True)
+def next_anchor_kernel(order, parents, anchor_at):
+    """For each pixel of a BFS tree, the first anchor met when walking from
+    it towards the root, not counting the pixel itself; -1 if none."""
+    ahead = np.full(parents.shape[0], -1, dtype=np.int32)
+    # BFS order visits every parent before its children
+    for i in range(1, order.shape[0]):
+        index = order[i]
+        parent = parents[index]
+        ahead[index] = anchor_at[parent] if anchor_at[parent] != -1 else ahead[parent]
+    return ahead
+
+
+def build_anchor_matrix(binary_image, anchor_pixels):
+    """All-pairs anchor distances and next-hop anchors, one BFS per anchor.
+
+    anchor_pixels holds the (row, col) of each anchor on walkable space, or
+    None for anchors that could not be placed. distances[i, j] is the path
+    length from anchor i to anchor j (-1 if unreachable). next_hop[i, j] is
+    the first anchor on that path after i, which is j when no other anchor
+    lies on the way. Returns a dict of arrays that can be stored with
+    pack_arrays.
+    """
+    rows, cols = binary_image.shape
+    walkable = to_walkable(binary_image)
+    count = len(anchor_pixels)
+    flat = np.array(
+        [-1 if p is None else p[0] * cols + p[1] for p in anchor_pixels],
+        dtype=np.int64,
+    )
+    anchor_at = np.full(rows * cols, -1, dtype=np.int32)
+    # Later anchors on a shared pixel are reached through the first one
+    for i in range(count - 1, -1, -1):
+        if flat[i] != -1:
+            anchor_at[flat[i]] = i
+
+    dtype = np.int16 if count < np.iinfo(np.int16).max else np.int32
+    distances = np.full((count, count), -1, dtype=np.int32)
+    next_hop = np.full((count, count), -1, dtype=dtype)
+    placed = flat != -1
+    for j in range(count):
+        if flat[j] == -1:
+            continue
+        column, parents, order = bfs_kernel(walkable, rows, cols, flat[j], -1)
+        ahead = next_anchor_kernel(order, parents, anchor_at)
+        distances[placed, j] = column[flat[placed]]
+        next_hop[placed, j] = ahead[flat[placed]]
+        distances[j, j] = 0
+        next_hop[j, j] = j
+    # Co-located anchors are their own next hop
+    next_hop[distances == 0] = np.nonzero(distances == 0)[1]
+    path_logs(f"build_anchor_matrix=====> {count} anchors")
+
+    return {"anchor_pixel": flat, "distances": distances, "next_hop": next_hop}
+
+
+def anchor_route(matrix, source, target):
+    """Distance and anchor sequence from anchor index source to target, read
+    from the matrix; (None, []) when unreachable."""
+    distance = int(matrix["distances"][source, target])
+    if distance < 0:
+        return None, []
+    route = [source]
+    while route[-1] != target:
+        route.append(int(matrix["next_hop"][route[-1], target]))
+    return distance, route
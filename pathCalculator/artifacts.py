@@ -0,0 +1,33 @@
+import os
+from io import BytesIO
+
+import numpy as np
+
+
+def pack_arrays(arrays):
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def unpack_arrays(data):
+    with np.load(BytesIO(data), allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def save_array_dir(directory, arrays):
+    # One uncompressed .npy per array so each can be memory-mapped
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+
+
+def load_array_dir(directory):
+    # Read-only memory maps: processes opening the same files share one copy
+    # through the page cache
+    return {
+        name[: -len(".npy")]: np.load(
+            os.path.join(directory, name), mmap_mode="r", allow_pickle=False
+        )
+        for name in os.listdir(directory)
+        if name.endswith(".npy")
+    }
@@ -0,0 +1,265 @@
+import heapq
+
+import numpy as np
+from services import path_logs
+from .grid_search import check_endpoints
+from .skeleton import build_skeleton_graph, route_on_skeleton, skeleton_path
+
+# Witness searches settle at most this many nodes; a missed witness only
+# costs a redundant shortcut
+WITNESS_LIMIT = 60
+
+
+def base_graph(skeleton):
+    # node -> {neighbor: (weight, middle node, skeleton edge)}; keeps the
+    # cheapest polyline between two junctions and drops loops
+    graph = {node: {} for node in range(len(skeleton["node_pixel"]))}
+    for edge, (u, v) in enumerate(skeleton["edge_nodes"].tolist()):
+        weight = int(skeleton["edge_weight"][edge])
+        if u != v and weight < graph[u].get(v, (weight + 1,))[0]:
+            graph[u][v] = graph[v][u] = (weight, -1, edge)
+    return graph
+
+
+def witness_distances(graph, source, excluded, max_cost):
+    distances = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    while heap and settled < WITNESS_LIMIT:
+        cost, node = heapq.heappop(heap)
+        if cost > distances[node]:
+            continue
+        if cost > max_cost:
+            break
+        settled += 1
+        for neighbor, (weight, _, _) in graph[node].items():
+            if neighbor == excluded:
+                continue
+            if cost + weight < distances.get(neighbor, cost + weight + 1):
+                distances[neighbor] = cost + weight
+                heapq.heappush(heap, (cost + weight, neighbor))
+    return distances
+
+
+def needed_shortcuts(graph, node):
+    # Pairs of neighbours whose only short connection runs through node
+    neighbors = [(other, entry[0]) for other, entry in graph[node].items()]
+    if len(neighbors) < 2:
+        return []
+    longest = max(weight for _, weight in neighbors)
+    shortcuts = []
+    for i, (u, u_weight) in enumerate(neighbors[:-1]):
+        distances = witness_distances(graph, u, node, u_weight + longest)
+        for w, w_weight in neighbors[i + 1 :]:
+            via = u_weight + w_weight
+            if distances.get(w, via + 1) > via:
+                shortcuts.append((u, w, via))
+    return shortcuts
+
+
+def build_contraction_hierarchy(binary_image, skeleton=None):
+    """Contract the skeleton graph into a contraction hierarchy.
+
+    Nodes are contracted in edge-difference order with lazy updates. Every
+    edge is kept once, directed from its lower to its higher ranked end, with
+    the contracted middle node of shortcuts (-1 for skeleton edges) so routes
+    can be unpacked. Returns the skeleton arrays plus the hierarchy, as a
+    dict of arrays that can be stored with pack_arrays.
+    """
+    if skeleton is None:
+        skeleton = build_skeleton_graph(binary_image)
+    graph = base_graph(skeleton)
+    count = len(graph)
+    deleted = np.zeros(count, dtype=np.int64)
+    rank = np.zeros(count, dtype=np.int32)
+
+    def priority(node):
+        shortcuts = needed_shortcuts(graph, node)
+        return len(shortcuts) - len(graph[node]) + deleted[node], shortcuts
+
+    queue = [(priority(node)[0], node) for node in range(count)]
+    heapq.heapify(queue)
+    up_edges = []
+    shortcut_count = 0
+    for order in range(count):
+        while True:
+            _, node = heapq.heappop(queue)
+            current, shortcuts = priority(node)
+            if not queue or current <= queue[0][0]:
+                break
+            heapq.heappush(queue, (current, node))
+
+        rank[node] = order
+        for neighbor, (weight, middle, edge) in graph[node].items():
+            up_edges.append((node, neighbor, weight, middle, edge))
+            del graph[neighbor][node]
+            deleted[neighbor] += 1
+        graph[node] = {}
+        for u, w, cost in shortcuts:
+            if cost < graph[u].get(w, (cost + 1,))[0]:
+                graph[u][w] = graph[w][u] = (cost, node, -1)
+                shortcut_count += 1
+
+    up_edges = np.array(up_edges, dtype=np.int64).reshape(-1, 5)
+    order = np.argsort(up_edges[:, 0], kind="stable")
+    up_edges = up_edges[order]
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(up_edges[:, 0], minlength=count), out=indptr[1:])
+    path_logs(
+        f"build_contraction_hierarchy=====> {count} nodes, {shortcut_count} shortcuts"
+    )
+
+    hierarchy = dict(skeleton)
+    hierarchy.update(
+        {
+            "ch_rank": rank,
+            "ch_indptr": indptr,
+            "ch_targets": up_edges[:, 1].astype(np.int32),
+            "ch_weights": up_edges[:, 2].astype(np.int32),
+            "ch_middle": up_edges[:, 3].astype(np.int32),
+            "ch_edge": up_edges[:, 4].astype(np.int32),
+        }
+    )
+    return hierarchy
+
+
+def link_seeds(hierarchy, link, toward_link):
+    # Graph nodes at both ends of the link's edge, with the cost and the
+    # polyline piece between node and attachment point
+    edge, offset = link
+    u, v = (int(x) for x in hierarchy["edge_nodes"][edge])
+    weight = int(hierarchy["edge_weight"][edge])
+    if toward_link:
+        return [
+            (u, offset, (edge, 0, offset)),
+            (v, weight - offset, (edge, weight, offset)),
+        ]
+    return [
+        (u, offset, (edge, offset, 0)),
+        (v, weight - offset, (edge, offset, weight)),
+    ]
+
+
+def unpack(hierarchy, a, b):
+    # Skeleton pieces along the hierarchy edge a -> b, shortcuts expanded
+    rank = hierarchy["ch_rank"]
+    indptr = hierarchy["ch_indptr"]
+    pieces = []
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        low, high = (a, b) if rank[a] < rank[b] else (b, a)
+        row = slice(indptr[low], indptr[low + 1])
+        i = indptr[low] + int(np.flatnonzero(hierarchy["ch_targets"][row] == high)[0])
+        middle = int(hierarchy["ch_middle"][i])
+        if middle != -1:
+            # Popped last-in first-out: a -> middle comes out before middle -> b
+            stack.append((middle, b))
+            stack.append((a, middle))
+            continue
+        edge = int(hierarchy["ch_edge"][i])
+        weight = int(hierarchy["edge_weight"][edge])
+        first = int(hierarchy["edge_nodes"][edge][0])
+        pieces.append((edge, 0, weight) if first == a else (edge, weight, 0))
+    return pieces
+
+
+def ch_search(hierarchy, start_link, end_link):
+    """Bidirectional upward Dijkstra between two attachment points.
+
+    Both searches start from the two ends of their link's edge. Returns
+    (cost, route, expanded) like skeleton_search.
+    """
+    indptr = hierarchy["ch_indptr"]
+    targets = hierarchy["ch_targets"]
+    weights = hierarchy["ch_weights"]
+
+    best, meet = None, None
+    if start_link[0] == end_link[0]:
+        best = abs(end_link[1] - start_link[1])
+
+    sides = []
+    for link, toward_link in ((start_link, False), (end_link, True)):
+        distances, parents, heap = {}, {}, []
+        for node, cost, piece in link_seeds(hierarchy, link, toward_link):
+            if cost < distances.get(node, cost + 1):
+                distances[node] = cost
+                parents[node] = piece
+                heapq.heappush(heap, (cost, node))
+        sides.append((distances, parents, heap))
+
+    expanded = 0
+    settled = [set(), set()]
+    while True:
+        live = [
+            side
+            for side in (0, 1)
+            if sides[side][2] and (best is None or sides[side][2][0][0] < best)
+        ]
+        if not live:
+            break
+        side = min(live, key=lambda s: sides[s][2][0][0])
+        distances, parents, heap = sides[side]
+        cost, node = heapq.heappop(heap)
+        if node in settled[side]:
+            continue
+        settled[side].add(node)
+        expanded += 1
+        other = sides[1 - side][0]
+        if node in other and (best is None or cost + other[node] < best):
+            best, meet = cost + other[node], node
+        for i in range(indptr[node], indptr[node + 1]):
+            neighbor = int(targets[i])
+            new_cost = cost + int(weights[i])
+            if new_cost < distances.get(neighbor, new_cost + 1):
+                distances[neighbor] = new_cost
+                parents[neighbor] = node
+                heapq.heappush(heap, (new_cost, neighbor))
+
+    if best is None:
+        return None, [], expanded
+    if meet is None:
+        return best, [(start_link[0], start_link[1], end_link[1])], expanded
+
+    def chain(parents, node):
+        # Hierarchy nodes from the seed up to node, and the seed's piece
+        nodes = [node]
+        while not isinstance(parents[nodes[-1]], tuple):
+            nodes.append(parents[nodes[-1]])
+        return nodes[::-1], parents[nodes[-1]]
+
+    up_nodes, start_piece = chain(sides[0][1], meet)
+    down_nodes, end_piece = chain(sides[1][1], meet)
+    nodes = up_nodes + down_nodes[::-1][1:]
+    route = [start_piece]
+    for a, b in zip(nodes, nodes[1:]):
+        route.extend(unpack(hierarchy, a, b))
+    route.append(end_piece)
+    return best, route, expanded
+
+
+def ch_path(binary_image, start, end, stats=None, hierarchy=None, skeleton=None):
+    """Skeleton routing answered from a precomputed contraction hierarchy;
+    same route costs as skeleton_path, with a much smaller search.
+
+    Without a hierarchy but with a skeleton graph, runs the plain skeleton
+    search instead, so callers can serve requests while the hierarchy is
+    being built.
+    """
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+    if stats is not None:
+        stats["hierarchy"] = hierarchy is not None or skeleton is None
+    if hierarchy is None and skeleton is not None:
+        return skeleton_path(binary_image, start, end, stats, skeleton)
+    if hierarchy is None:
+        hierarchy = build_contraction_hierarchy(binary_image)
+    return route_on_skeleton(
+        binary_image,
+        start,
+        end,
+        stats,
+        hierarchy,
+        lambda start_link, end_link: ch_search(hierarchy, start_link, end_link),
+    )
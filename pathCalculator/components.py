@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+
+def build_components(binary_image):
+    """Label the 4-connected walkable regions of a binary image.
+
+    Walls get label 0. Returns a dict of arrays that can be stored with
+    pack_arrays.
+    """
+    count, labels = cv2.connectedComponents(
+        (binary_image == 255).astype(np.uint8), connectivity=4, ltype=cv2.CV_32S
+    )
+    dtype = np.uint16 if count <= np.iinfo(np.uint16).max else np.int32
+    return {
+        "labels": labels.astype(dtype),
+        "count": np.array([count - 1], dtype=np.int64),
+    }
+
+
+def component_of(components, point):
+    # 0 for walls and points outside the image
+    labels = components["labels"]
+    row, col = int(point[0]), int(point[1])
+    if not (0 <= row < labels.shape[0] and 0 <= col < labels.shape[1]):
+        return 0
+    return int(labels[row, col])
+
+
+def check_components(components, start, end):
+    """Constant-time reachability test on the label map.
+
+    Returns the endpoint labels and, when no route can exist, an
+    (error message, HTTP status) pair.
+    """
+    labels = {"start": component_of(components, start)}
+    labels["end"] = component_of(components, end)
+    if not labels["start"] or not labels["end"]:
+        return labels, ("Start or end point is not walkable", 400)
+    if labels["start"] != labels["end"]:
+        return labels, ("No path between start and end points", 404)
+    return labels, None
@@ -0,0 +1,138 @@
+import heapq
+
+import networkx as nx
+import numpy as np
+from .kernels import NUMBA_AVAILABLE, astar_kernel, bfs_kernel, landmark_bound
+
+# 4-connected moves, same neighbourhood as create_graph
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+# Empty landmark table: plain Manhattan A*
+NO_LANDMARKS = np.zeros((0, 1), dtype=np.uint16)
+
+
+def to_walkable(binary_image):
+    return np.ascontiguousarray(binary_image == 255).ravel()
+
+
+def check_endpoints(binary_image, start, end):
+    rows, cols = binary_image.shape
+    for row, col in (start, end):
+        if not (0 <= row < rows and 0 <= col < cols) or binary_image[row, col] != 255:
+            raise nx.NodeNotFound(
+                f"Either source {start} or target {end} is not walkable"
+            )
+
+
+def unwind_path(parents, end_index, cols):
+    path = []
+    index = int(end_index)
+    while index != -1:
+        path.append((index // cols, index % cols))
+        index = int(parents[index])
+    path.reverse()
+    return path
+
+
+def grid_astar(binary_image, start, end, stats=None, landmarks=None):
+    """A* over the thresholded image itself, without building a graph.
+
+    Pixels are addressed by flat index (row * cols + col); g-scores and parent
+    pointers live in numpy arrays. With landmarks (see build_landmarks) the
+    Manhattan heuristic is tightened by the ALT bound. Returns a list of
+    (row, col) tuples like shortest_path, and raises the same networkx
+    exceptions.
+    """
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+
+    rows, cols = binary_image.shape
+    walkable = to_walkable(binary_image)
+    table = NO_LANDMARKS if landmarks is None else landmarks["distances"]
+    if table.shape[1] != rows * cols and len(table):
+        raise ValueError("Landmarks were built for a different image size")
+    if NUMBA_AVAILABLE:
+        parents, found, expanded = astar_kernel(
+            walkable,
+            rows,
+            cols,
+            start[0] * cols + start[1],
+            end[0] * cols + end[1],
+            table,
+        )
+        if stats is not None:
+            stats["expanded"] = int(expanded)
+        if not found:
+            raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+        return unwind_path(parents, end[0] * cols + end[1], cols)
+
+    g_score = np.full(rows * cols, -1, dtype=np.int64)
+    parents = np.full(rows * cols, -1, dtype=np.int64)
+    closed = np.zeros(rows * cols, dtype=np.bool_)
+
+    start_index = start[0] * cols + start[1]
+    end_index = end[0] * cols + end[1]
+    end_row, end_col = end
+    # NO_LANDMARKS has a single column: only index a real table
+    use_landmarks = len(table) > 0
+    if use_landmarks:
+        goal_distances = table[:, end_index].astype(np.int64)
+
+    g_score[start_index] = 0
+    start_h = abs(start[0] - end_row) + abs(start[1] - end_col)
+    if use_landmarks:
+        start_h = max(start_h, landmark_bound(table, goal_distances, start_index))
+    open_set = [(start_h, start_h, start_index)]
+    expanded = 0
+
+    while open_set:
+        _, _, index = heapq.heappop(open_set)
+        if closed[index]:
+            continue
+        closed[index] = True
+        expanded += 1
+
+        if index == end_index:
+            if stats is not None:
+                stats["expanded"] = expanded
+            return unwind_path(parents, end_index, cols)
+
+        row, col = divmod(index, cols)
+        next_g = g_score[index] + 1
+        for dr, dc in NEIGHBOR_OFFSETS:
+            nr, nc = row + dr, col + dc
+            if not (0 <= nr < rows and 0 <= nc < cols):
+                continue
+            neighbor = nr * cols + nc
+            if not walkable[neighbor] or closed[neighbor]:
+                continue
+            if g_score[neighbor] == -1 or next_g < g_score[neighbor]:
+                g_score[neighbor] = next_g
+                parents[neighbor] = index
+                h = abs(nr - end_row) + abs(nc - end_col)
+                if use_landmarks:
+                    h = max(h, landmark_bound(table, goal_distances, neighbor))
+                heapq.heappush(open_set, (next_g + h, h, neighbor))
+
+    if stats is not None:
+        stats["expanded"] = expanded
+    raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+
+
+def grid_bfs(binary_image, start, end, stats=None):
+    """Breadth-first search; optimal here since every step costs 1."""
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+
+    rows, cols = binary_image.shape
+    end_index = end[0] * cols + end[1]
+    distances, parents, order = bfs_kernel(
+        to_walkable(binary_image), rows, cols, start[0] * cols + start[1], end_index
+    )
+    if stats is not None:
+        stats["expanded"] = len(order)
+    if distances[end_index] == -1:
+        raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+    return unwind_path(parents, end_index, cols)
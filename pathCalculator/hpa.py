@@ -0,0 +1,257 @@
+import heapq
+
+import networkx as nx
+import numpy as np
+from config import HPA_CLUSTER_SIZE
+from services import path_logs
+from .grid_search import check_endpoints, grid_bfs
+from .kernels import bfs_kernel
+
+# Border openings at least this wide get a transition at both ends instead
+# of a single one in the middle
+WIDE_ENTRANCE = 6
+
+
+def border_runs(open_pairs):
+    # (first, last) offsets of each run of True values
+    padded = np.concatenate(([0], open_pairs.astype(np.int8), [0]))
+    changes = np.flatnonzero(np.diff(padded))
+    return zip(changes[::2], changes[1::2] - 1)
+
+
+def entrance_offsets(first, last):
+    if last - first + 1 >= WIDE_ENTRANCE:
+        return (first, last)
+    return ((first + last) // 2,)
+
+
+def find_transitions(walkable, cluster_size):
+    rows, cols = walkable.shape
+    transitions = []
+
+    # Borders between horizontally adjacent clusters
+    for col in range(cluster_size - 1, cols - 1, cluster_size):
+        open_pairs = walkable[:, col] & walkable[:, col + 1]
+        for top in range(0, rows, cluster_size):
+            for first, last in border_runs(open_pairs[top : top + cluster_size]):
+                for offset in entrance_offsets(first, last):
+                    row = top + offset
+                    transitions.append((row * cols + col, row * cols + col + 1))
+
+    # Borders between vertically adjacent clusters
+    for row in range(cluster_size - 1, rows - 1, cluster_size):
+        open_pairs = walkable[row, :] & walkable[row + 1, :]
+        for left in range(0, cols, cluster_size):
+            for first, last in border_runs(open_pairs[left : left + cluster_size]):
+                for offset in entrance_offsets(first, last):
+                    col = left + offset
+                    transitions.append((row * cols + col, (row + 1) * cols + col))
+
+    return np.array(transitions, dtype=np.int64).reshape(-1, 2)
+
+
+def cluster_of(pixel, cols, cluster_size, cluster_cols):
+    row, col = divmod(int(pixel), cols)
+    return (row // cluster_size) * cluster_cols + col // cluster_size
+
+
+def cluster_window(cluster, shape, cluster_size, cluster_cols):
+    rows, cols = shape
+    top = (cluster // cluster_cols) * cluster_size
+    left = (cluster % cluster_cols) * cluster_size
+    return top, min(top + cluster_size, rows), left, min(left + cluster_size, cols)
+
+
+def window_distances(walkable, window, pixel, cols):
+    # BFS distances from pixel, restricted to the window
+    top, bottom, left, right = window
+    local = np.ascontiguousarray(walkable[top:bottom, left:right]).ravel()
+    width = right - left
+    row, col = divmod(int(pixel), cols)
+    distances, _, _ = bfs_kernel(
+        local, bottom - top, width, (row - top) * width + col - left, -1
+    )
+    return distances
+
+
+def local_index(pixel, window, cols):
+    top, _, left, right = window
+    row, col = divmod(int(pixel), cols)
+    return (row - top) * (right - left) + col - left
+
+
+def to_csr(sources, targets, weights, size):
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32), weights[order].astype(np.int32)
+
+
+def build_hpa(binary_image, cluster_size=HPA_CLUSTER_SIZE):
+    """Precompute the HPA* abstract graph of a binary image.
+
+    The grid is cut into cluster_size square clusters. Each opening between
+    two clusters gets transition pixels (abstract nodes) on both sides. Nodes
+    of the same cluster are linked by their BFS distance inside the cluster.
+    Returns a dict of arrays that can be stored with pack_arrays.
+    """
+    rows, cols = binary_image.shape
+    walkable = binary_image == 255
+    cluster_cols = -(-cols // cluster_size)
+
+    transitions = find_transitions(walkable, cluster_size)
+    node_pixel = np.unique(transitions)
+    node_cluster = np.array(
+        [cluster_of(p, cols, cluster_size, cluster_cols) for p in node_pixel],
+        dtype=np.int64,
+    )
+
+    edges = [(a, b, 1) for a, b in np.searchsorted(node_pixel, transitions).tolist()]
+
+    # Intra-cluster distances, one windowed BFS per node
+    order = np.argsort(node_cluster, kind="stable")
+    boundaries = np.flatnonzero(np.diff(node_cluster[order])) + 1
+    for members in np.split(order, boundaries):
+        if len(members) < 2:
+            continue
+        window = cluster_window(
+            node_cluster[members[0]], (rows, cols), cluster_size, cluster_cols
+        )
+        for i, node in enumerate(members[:-1]):
+            distances = window_distances(walkable, window, node_pixel[node], cols)
+            for other in members[i + 1 :]:
+                distance = distances[local_index(node_pixel[other], window, cols)]
+                if distance > 0:
+                    edges.append((node, other, int(distance)))
+
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 3)
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    weights = np.concatenate((edges[:, 2], edges[:, 2]))
+    indptr, adj_nodes, adj_weights = to_csr(sources, targets, weights, len(node_pixel))
+    path_logs(f"build_hpa=====> {len(node_pixel)} nodes, {len(edges)} edges")
+
+    return {
+        "meta": np.array([rows, cols, cluster_size], dtype=np.int64),
+        "node_pixel": node_pixel,
+        "node_cluster": node_cluster,
+        "adj_indptr": indptr,
+        "adj_nodes": adj_nodes,
+        "adj_weights": adj_weights,
+    }
+
+
+def window_path(binary_image, window, a, b, cols):
+    top, bottom, left, right = window
+    local = binary_image[top:bottom, left:right]
+    ar, ac = divmod(int(a), cols)
+    br, bc = divmod(int(b), cols)
+    path = grid_bfs(local, (ar - top, ac - left), (br - top, bc - left))
+    return [(row + top, col + left) for row, col in path]
+
+
+def hpa_path(binary_image, start, end, stats=None, hpa=None):
+    """Route over the precomputed HPA* graph, then refine each abstract hop
+    with a BFS inside its cluster. Near-optimal, not exact."""
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+    if hpa is None:
+        hpa = build_hpa(binary_image)
+
+    rows, cols, cluster_size = (int(v) for v in hpa["meta"])
+    if (rows, cols) != binary_image.shape:
+        raise ValueError("HPA graph was built for a different image size")
+    cluster_cols = -(-cols // cluster_size)
+    node_pixel = hpa["node_pixel"]
+    node_cluster = hpa["node_cluster"]
+    indptr = hpa["adj_indptr"]
+    adj_nodes = hpa["adj_nodes"]
+    adj_weights = hpa["adj_weights"]
+    walkable = binary_image == 255
+
+    start_pixel = start[0] * cols + start[1]
+    end_pixel = end[0] * cols + end[1]
+    start_cluster = cluster_of(start_pixel, cols, cluster_size, cluster_cols)
+    end_cluster = cluster_of(end_pixel, cols, cluster_size, cluster_cols)
+    start_window = cluster_window(
+        start_cluster, (rows, cols), cluster_size, cluster_cols
+    )
+    end_window = cluster_window(end_cluster, (rows, cols), cluster_size, cluster_cols)
+    start_distances = window_distances(walkable, start_window, start_pixel, cols)
+    end_distances = window_distances(walkable, end_window, end_pixel, cols)
+
+    # Abstract search with virtual START / GOAL nodes linked into the graph
+    START, GOAL = -1, -2
+    g_score = {START: 0}
+    parents = {START: None}
+    open_set = []
+
+    def relax(node, cost, parent):
+        if cost < g_score.get(node, cost + 1):
+            g_score[node] = cost
+            parents[node] = parent
+            if node == GOAL:
+                h = 0
+            else:
+                row, col = divmod(int(node_pixel[node]), cols)
+                h = abs(row - end[0]) + abs(col - end[1])
+            heapq.heappush(open_set, (cost + h, node))
+
+    if start_cluster == end_cluster:
+        direct = end_distances[local_index(start_pixel, end_window, cols)]
+        if direct >= 0:
+            relax(GOAL, int(direct), START)
+    for node in np.flatnonzero(node_cluster == start_cluster).tolist():
+        distance = start_distances[local_index(node_pixel[node], start_window, cols)]
+        if distance >= 0:
+            relax(node, int(distance), START)
+    goal_links = {}
+    for node in np.flatnonzero(node_cluster == end_cluster).tolist():
+        distance = end_distances[local_index(node_pixel[node], end_window, cols)]
+        if distance >= 0:
+            goal_links[node] = int(distance)
+
+    expanded = 0
+    closed = set()
+    while open_set:
+        _, node = heapq.heappop(open_set)
+        if node in closed:
+            continue
+        closed.add(node)
+        expanded += 1
+        if node == GOAL:
+            break
+        cost = g_score[node]
+        if node in goal_links:
+            relax(GOAL, cost + goal_links[node], node)
+        for i in range(indptr[node], indptr[node + 1]):
+            neighbor = int(adj_nodes[i])
+            if neighbor not in closed:
+                relax(neighbor, cost + int(adj_weights[i]), node)
+
+    if stats is not None:
+        stats["expanded"] = expanded
+        stats["abstract_nodes"] = len(node_pixel)
+    if GOAL not in closed:
+        raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+
+    hops = []
+    node = parents[GOAL]
+    while node != START:
+        hops.append(node)
+        node = parents[node]
+    hops.reverse()
+
+    # Refine: first and last legs inside the endpoint clusters, then each hop
+    waypoints = [start_pixel] + [int(node_pixel[n]) for n in hops] + [end_pixel]
+    clusters = [start_cluster] + [int(node_cluster[n]) for n in hops] + [end_cluster]
+    path = [start]
+    for i in range(len(waypoints) - 1):
+        a, b = waypoints[i], waypoints[i + 1]
+        if clusters[i] != clusters[i + 1]:
+            path.append(divmod(b, cols))
+            continue
+        window = cluster_window(clusters[i], (rows, cols), cluster_size, cluster_cols)
+        path.extend(window_path(binary_image, window, a, b, cols)[1:])
+    return path
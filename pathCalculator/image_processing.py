@@ -44,3 +44,15 @@ def resize_image(image, scale_percent=50):
     width = int(image.shape[1] * scale_percent / 100)
     height = int(image.shape[0] * scale_percent / 100)
     return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def encode_binary_image(binary_image):
+    # One bit per pixel, set where walkable (255); 8x smaller than uint8
+    packed = np.packbits(np.asarray(binary_image) == 255)
+    return packed.tobytes(), list(binary_image.shape)
+
+
+def decode_binary_image(packed, shape):
+    rows, cols = shape
+    bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=rows * cols)
+    return (bits * 255).astype(np.uint8).reshape(rows, cols)
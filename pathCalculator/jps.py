@@ -0,0 +1,281 @@
+import networkx as nx
+import numpy as np
+from .grid_search import check_endpoints, to_walkable
+from .kernels import njit, heap_push, heap_pop
+
+# Direction k moves by (ROW_STEP[k], COL_STEP[k]); same order as
+# kernels.neighbor_index: up, down, left, right
+ROW_STEP = np.array([-1, 1, 0, 0], dtype=np.int64)
+COL_STEP = np.array([0, 0, -1, 1], dtype=np.int64)
+
+
+@njit(cache=True)
+def is_open(walkable, rows, cols, row, col):
+    return 0 <= row < rows and 0 <= col < cols and walkable[row * cols + col]
+
+
+@njit(cache=True)
+def horizontal_forced(walkable, rows, cols, row, col, dc):
+    # Moving along a row: a side cell that opens up right after a wall
+    return (
+        is_open(walkable, rows, cols, row - 1, col)
+        and not is_open(walkable, rows, cols, row - 1, col - dc)
+    ) or (
+        is_open(walkable, rows, cols, row + 1, col)
+        and not is_open(walkable, rows, cols, row + 1, col - dc)
+    )
+
+
+@njit(cache=True)
+def vertical_forced(walkable, rows, cols, row, col, dr):
+    return (
+        is_open(walkable, rows, cols, row, col - 1)
+        and not is_open(walkable, rows, cols, row - dr, col - 1)
+    ) or (
+        is_open(walkable, rows, cols, row, col + 1)
+        and not is_open(walkable, rows, cols, row - dr, col + 1)
+    )
+
+
+@njit(cache=True)
+def jump_horizontal(walkable, rows, cols, row, col, dc, goal):
+    while True:
+        col += dc
+        if not is_open(walkable, rows, cols, row, col):
+            return -1
+        index = row * cols + col
+        if index == goal or horizontal_forced(walkable, rows, cols, row, col, dc):
+            return index
+
+
+@njit(cache=True)
+def jump_vertical(walkable, rows, cols, row, col, dr, goal):
+    while True:
+        row += dr
+        if not is_open(walkable, rows, cols, row, col):
+            return -1
+        index = row * cols + col
+        if index == goal or vertical_forced(walkable, rows, cols, row, col, dr):
+            return index
+        # Vertical runs stop wherever a horizontal jump finds something
+        if (
+            jump_horizontal(walkable, rows, cols, row, col, 1, goal) != -1
+            or jump_horizontal(walkable, rows, cols, row, col, -1, goal) != -1
+        ):
+            return index
+
+
+@njit(cache=True)
+def successor_directions(parent, index, cols):
+    # Returns a 4-slot mask of directions to explore from index
+    mask = np.zeros(4, dtype=np.bool_)
+    if parent == -1:
+        mask[:] = True
+    elif parent // cols == index // cols:
+        # Arrived horizontally: keep going, or turn up/down
+        mask[0] = True
+        mask[1] = True
+        if index % cols > parent % cols:
+            mask[3] = True
+        else:
+            mask[2] = True
+    else:
+        mask[2] = True
+        mask[3] = True
+        if index > parent:
+            mask[1] = True
+        else:
+            mask[0] = True
+    return mask
+
+
+@njit(cache=True)
+def jps_kernel(walkable, rows, cols, start, goal, jump_table, use_table):
+    """Jump Point Search over a 4-connected uniform-cost grid.
+
+    With use_table, jumps are read from a JPS+ table built by
+    jump_table_kernel instead of being scanned. Returns (parents, found,
+    expanded); parents link jump points only.
+    """
+    n = rows * cols
+    g_score = np.full(n, -1, dtype=np.int64)
+    parents = np.full(n, -1, dtype=np.int32)
+    closed = np.zeros(n, dtype=np.bool_)
+    goal_row = goal // cols
+    goal_col = goal - goal_row * cols
+
+    keys = np.empty(1024, dtype=np.int64)
+    values = np.empty(1024, dtype=np.int32)
+    size = 0
+    h = abs(start // cols - goal_row) + abs(start % cols - goal_col)
+    g_score[start] = 0
+    keys, values, size = heap_push(keys, values, size, (h << 32) | h, start)
+
+    expanded = 0
+    while size > 0:
+        index, size = heap_pop(keys, values, size)
+        if closed[index]:
+            continue
+        closed[index] = True
+        expanded += 1
+        if index == goal:
+            return parents, True, expanded
+
+        row = index // cols
+        col = index - row * cols
+        mask = successor_directions(parents[index], index, cols)
+        for k in range(4):
+            if not mask[k]:
+                continue
+            dr = ROW_STEP[k]
+            dc = COL_STEP[k]
+            if use_table:
+                target = table_jump(jump_table, k, row, col, dr, dc, cols, goal)
+            elif dr == 0:
+                target = jump_horizontal(walkable, rows, cols, row, col, dc, goal)
+            else:
+                target = jump_vertical(walkable, rows, cols, row, col, dr, goal)
+            if target == -1 or closed[target]:
+                continue
+
+            next_g = (
+                g_score[index] + abs(target // cols - row) + abs(target % cols - col)
+            )
+            if g_score[target] == -1 or next_g < g_score[target]:
+                g_score[target] = next_g
+                parents[target] = index
+                h = abs(target // cols - goal_row) + abs(target % cols - goal_col)
+                keys, values, size = heap_push(
+                    keys, values, size, ((next_g + h) << 32) | h, target
+                )
+    return parents, False, expanded
+
+
+@njit(cache=True)
+def table_jump(jump_table, k, row, col, dr, dc, cols, goal):
+    distance = jump_table[k, row * cols + col]
+    reach = distance if distance > 0 else -distance
+    goal_row = goal // cols
+    goal_col = goal - goal_row * cols
+
+    # The goal lies on this run: go straight to it
+    if dr == 0 and goal_row == row and 0 < (goal_col - col) * dc <= reach:
+        return goal
+    if dc == 0 and goal_col == col and 0 < (goal_row - row) * dr <= reach:
+        return goal
+    # Moving vertically past the goal's row: stop there and let the
+    # horizontal expansion try to reach it
+    if dc == 0 and 0 < (goal_row - row) * dr <= reach:
+        return goal_row * cols + col
+    if distance <= 0:
+        return -1
+    return (row + dr * distance) * cols + col + dc * distance
+
+
+@njit(cache=True)
+def jump_table_kernel(walkable, rows, cols, table):
+    """Fill the JPS+ table: table[k, i] > 0 is the distance to the next jump
+    point from pixel i in direction k, table[k, i] <= 0 is minus the number of
+    free steps before a wall."""
+    # Horizontal passes first; vertical jump points depend on them
+    for row in range(rows):
+        for k in (2, 3):
+            dc = COL_STEP[k]
+            col = cols - 1 if dc == 1 else 0
+            while 0 <= col < cols:
+                index = row * cols + col
+                next_col = col + dc
+                if not is_open(walkable, rows, cols, row, next_col):
+                    table[k, index] = 0
+                elif horizontal_forced(walkable, rows, cols, row, next_col, dc):
+                    table[k, index] = 1
+                else:
+                    following = table[k, index + dc]
+                    table[k, index] = following + 1 if following > 0 else following - 1
+                col -= dc
+
+    for col in range(cols):
+        for k in (0, 1):
+            dr = ROW_STEP[k]
+            row = rows - 1 if dr == 1 else 0
+            while 0 <= row < rows:
+                index = row * cols + col
+                next_row = row + dr
+                if not is_open(walkable, rows, cols, next_row, col):
+                    table[k, index] = 0
+                else:
+                    next_index = next_row * cols + col
+                    if (
+                        vertical_forced(walkable, rows, cols, next_row, col, dr)
+                        or table[2, next_index] > 0
+                        or table[3, next_index] > 0
+                    ):
+                        table[k, index] = 1
+                    else:
+                        following = table[k, next_index]
+                        table[k, index] = (
+                            following + 1 if following > 0 else following - 1
+                        )
+                row -= dr
+    return table
+
+
+def build_jump_table(binary_image):
+    rows, cols = binary_image.shape
+    dtype = np.int16 if max(rows, cols) < np.iinfo(np.int16).max else np.int32
+    table = np.zeros((4, rows * cols), dtype=dtype)
+    return jump_table_kernel(to_walkable(binary_image), rows, cols, table)
+
+
+def unwind_jump_path(parents, end_index, cols):
+    # Expand the chain of jump points back into single pixel steps
+    jump_points = []
+    index = int(end_index)
+    while index != -1:
+        jump_points.append(divmod(index, cols))
+        index = int(parents[index])
+    jump_points.reverse()
+
+    path = [jump_points[0]]
+    for (r1, c1), (r2, c2) in zip(jump_points, jump_points[1:]):
+        steps = abs(r2 - r1) + abs(c2 - c1)
+        dr = (r2 > r1) - (r2 < r1)
+        dc = (c2 > c1) - (c2 < c1)
+        path.extend((r1 + dr * i, c1 + dc * i) for i in range(1, steps + 1))
+    return path
+
+
+def run_jps(binary_image, start, end, stats, jump_table):
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+
+    rows, cols = binary_image.shape
+    use_table = jump_table is not None
+    if not use_table:
+        jump_table = np.zeros((4, 1), dtype=np.int16)
+    end_index = end[0] * cols + end[1]
+    parents, found, expanded = jps_kernel(
+        to_walkable(binary_image),
+        rows,
+        cols,
+        start[0] * cols + start[1],
+        end_index,
+        jump_table,
+        use_table,
+    )
+    if stats is not None:
+        stats["expanded"] = int(expanded)
+    if not found:
+        raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+    return unwind_jump_path(parents, end_index, cols)
+
+
+def jps_path(binary_image, start, end, stats=None):
+    return run_jps(binary_image, start, end, stats, None)
+
+
+def jps_plus_path(binary_image, start, end, stats=None, jump_table=None):
+    if jump_table is None:
+        jump_table = build_jump_table(binary_image)
+    return run_jps(binary_image, start, end, stats, jump_table)
@@ -0,0 +1,229 @@
+import os
+
+import numpy as np
+from config import NUMBA_CACHE_DIR
+
+# numba reads NUMBA_CACHE_DIR when it is imported, so set it first
+if NUMBA_CACHE_DIR:
+    os.environ.setdefault("NUMBA_CACHE_DIR", NUMBA_CACHE_DIR)
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Pure-Python fallback: the kernels below run interpreted
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+@njit(cache=True)
+def edge_kernel(binary_image):
+    rows, cols = binary_image.shape
+
+    count = 0
+    for row in range(rows):
+        for col in range(cols):
+            if binary_image[row, col] == 255:
+                if row > 0 and binary_image[row - 1, col] == 255:
+                    count += 1
+                if row < rows - 1 and binary_image[row + 1, col] == 255:
+                    count += 1
+                if col > 0 and binary_image[row, col - 1] == 255:
+                    count += 1
+                if col < cols - 1 and binary_image[row, col + 1] == 255:
+                    count += 1
+
+    edges = np.empty((count, 4), dtype=np.int32)
+    count = 0
+    for row in range(rows):
+        for col in range(cols):
+            if binary_image[row, col] != 255:
+                continue
+            for k in range(4):
+                nr, nc = row, col
+                if k == 0:
+                    nr = row - 1
+                elif k == 1:
+                    nr = row + 1
+                elif k == 2:
+                    nc = col - 1
+                else:
+                    nc = col + 1
+                if 0 <= nr < rows and 0 <= nc < cols and binary_image[nr, nc] == 255:
+                    edges[count, 0] = row
+                    edges[count, 1] = col
+                    edges[count, 2] = nr
+                    edges[count, 3] = nc
+                    count += 1
+    return edges
+
+
+@njit(cache=True)
+def neighbor_index(index, k, rows, cols):
+    # Flat index of the k-th 4-connected neighbour, or -1 off the grid
+    row = index // cols
+    col = index - row * cols
+    if k == 0:
+        return index - cols if row > 0 else -1
+    if k == 1:
+        return index + cols if row < rows - 1 else -1
+    if k == 2:
+        return index - 1 if col > 0 else -1
+    return index + 1 if col < cols - 1 else -1
+
+
+@njit(cache=True)
+def bfs_kernel(walkable, rows, cols, start, goal):
+    """Breadth-first search from start; stops early once goal (>= 0) is reached.
+
+    Returns (distances, parents, order) where order lists visited pixels in
+    BFS order. Unvisited pixels have distance -1.
+    """
+    n = rows * cols
+    distances = np.full(n, -1, dtype=np.int32)
+    parents = np.full(n, -1, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+
+    distances[start] = 0
+    queue[0] = start
+    head = 0
+    tail = 1
+    while head < tail:
+        index = queue[head]
+        head += 1
+        if index == goal:
+            break
+        for k in range(4):
+            neighbor = neighbor_index(index, k, rows, cols)
+            if neighbor == -1 or not walkable[neighbor] or distances[neighbor] != -1:
+                continue
+            distances[neighbor] = distances[index] + 1
+            parents[neighbor] = index
+            queue[tail] = neighbor
+            tail += 1
+    return distances, parents, queue[:tail]
+
+
+@njit(cache=True)
+def reachable_kernel(walkable, rows, cols, start):
+    distances, _, _ = bfs_kernel(walkable, rows, cols, start, -1)
+    return distances >= 0
+
+
+@njit(cache=True)
+def heap_push(keys, values, size, key, value):
+    if size == keys.shape[0]:
+        new_keys = np.empty(size * 2, dtype=keys.dtype)
+        new_values = np.empty(size * 2, dtype=values.dtype)
+        new_keys[:size] = keys
+        new_values[:size] = values
+        keys = new_keys
+        values = new_values
+    i = size
+    while i > 0:
+        parent = (i - 1) // 2
+        if keys[parent] <= key:
+            break
+        keys[i] = keys[parent]
+        values[i] = values[parent]
+        i = parent
+    keys[i] = key
+    values[i] = value
+    return keys, values, size + 1
+
+
+@njit(cache=True)
+def heap_pop(keys, values, size):
+    top = values[0]
+    size -= 1
+    key = keys[size]
+    value = values[size]
+    i = 0
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and keys[child + 1] < keys[child]:
+            child += 1
+        if keys[child] >= key:
+            break
+        keys[i] = keys[child]
+        values[i] = values[child]
+        i = child
+    if size > 0:
+        keys[i] = key
+        values[i] = value
+    return top, size
+
+
+# Landmark distance value for pixels a landmark cannot reach
+UNREACHED = 65535
+
+
+@njit(cache=True)
+def landmark_bound(landmarks, goal_distances, index):
+    # ALT lower bound: max over landmarks L of |d(L, goal) - d(L, index)|
+    bound = 0
+    for k in range(landmarks.shape[0]):
+        distance = np.int64(landmarks[k, index])
+        if distance == UNREACHED or goal_distances[k] == UNREACHED:
+            continue
+        bound = max(bound, abs(distance - goal_distances[k]))
+    return bound
+
+
+@njit(cache=True)
+def astar_kernel(walkable, rows, cols, start, goal, landmarks):
+    """A* with a Manhattan heuristic, tightened by the ALT bound when
+    landmarks (a (k, rows * cols) distance table) has rows.
+
+    Returns (parents, found, expanded).
+    """
+    n = rows * cols
+    g_score = np.full(n, -1, dtype=np.int64)
+    parents = np.full(n, -1, dtype=np.int32)
+    closed = np.zeros(n, dtype=np.bool_)
+    goal_row = goal // cols
+    goal_col = goal - goal_row * cols
+    goal_distances = np.empty(landmarks.shape[0], dtype=np.int64)
+    for k in range(landmarks.shape[0]):
+        goal_distances[k] = landmarks[k, goal]
+
+    # Heap keys pack (f, h) so ties on f prefer the node closer to the goal
+    keys = np.empty(1024, dtype=np.int64)
+    values = np.empty(1024, dtype=np.int32)
+    size = 0
+    h = abs(start // cols - goal_row) + abs(start % cols - goal_col)
+    h = max(h, landmark_bound(landmarks, goal_distances, start))
+    g_score[start] = 0
+    keys, values, size = heap_push(keys, values, size, (h << 32) | h, start)
+
+    expanded = 0
+    while size > 0:
+        index, size = heap_pop(keys, values, size)
+        if closed[index]:
+            continue
+        closed[index] = True
+        expanded += 1
+        if index == goal:
+            return parents, True, expanded
+
+        next_g = g_score[index] + 1
+        for k in range(4):
+            neighbor = neighbor_index(index, k, rows, cols)
+            if neighbor == -1 or not walkable[neighbor] or closed[neighbor]:
+                continue
+            if g_score[neighbor] == -1 or next_g < g_score[neighbor]:
+                g_score[neighbor] = next_g
+                parents[neighbor] = index
+                h = abs(neighbor // cols - goal_row) + abs(neighbor % cols - goal_col)
+                h = max(h, landmark_bound(landmarks, goal_distances, neighbor))
+                keys, values, size = heap_push(
+                    keys, values, size, ((next_g + h) << 32) | h, neighbor
+                )
+    return parents, False, expanded
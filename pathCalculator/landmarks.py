@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+from config import ALT_LANDMARKS
+from services import path_logs
+from .components import build_components
+from .grid_search import grid_astar, to_walkable
+from .kernels import njit, bfs_kernel, landmark_bound, UNREACHED
+
+
+@njit(cache=True)
+def landmark_row_kernel(column, row, nearest):
+    # Store one landmark's BFS distances and update each pixel's distance to
+    # its nearest landmark so far
+    for i in range(column.shape[0]):
+        distance = column[i]
+        if distance < 0:
+            continue
+        if distance < UNREACHED:
+            row[i] = distance
+        if distance < nearest[i]:
+            nearest[i] = distance
+
+
+def build_landmarks(binary_image, count=ALT_LANDMARKS):
+    """Pick ALT landmarks by farthest-point sampling and store the BFS
+    distance from each of them to every pixel.
+
+    Landmarks are spread over the largest walkable region; pixels a
+    landmark cannot reach (or further than the uint16 range) hold
+    UNREACHED. Returns a dict of arrays that can be stored with pack_arrays.
+    """
+    rows, cols = binary_image.shape
+    walkable = to_walkable(binary_image)
+    pixels = []
+    distances = np.full((count, rows * cols), UNREACHED, dtype=np.uint16)
+
+    labels = build_components(binary_image)["labels"].ravel()
+    sizes = np.bincount(labels)[1:]
+    if count and len(sizes) and sizes.max():
+        # Seed from any pixel of the largest region; its farthest pixel is
+        # the first landmark
+        seed = int(np.flatnonzero(labels == np.argmax(sizes) + 1)[0])
+        nearest, _, _ = bfs_kernel(walkable, rows, cols, seed, -1)
+        for k in range(count):
+            pixel = int(np.argmax(nearest))
+            if nearest[pixel] <= 0 and k:
+                break
+            column, _, _ = bfs_kernel(walkable, rows, cols, pixel, -1)
+            landmark_row_kernel(column, distances[k], nearest)
+            pixels.append(pixel)
+    path_logs(f"build_landmarks=====> {len(pixels)} landmarks")
+
+    return {
+        "landmark_pixel": np.array(pixels, dtype=np.int64),
+        "distances": distances[: len(pixels)],
+    }
+
+
+def landmark_heuristic(landmarks, cols):
+    """ALT heuristic for nx.astar_path over (row, col) nodes, never below
+    the Euclidean distance used by shortest_path."""
+    table = landmarks["distances"]
+
+    def heuristic(a, b):
+        goal_distances = table[:, b[0] * cols + b[1]].astype(np.int64)
+        bound = landmark_bound(table, goal_distances, a[0] * cols + a[1])
+        return max(math.dist(a, b), bound)
+
+    return heuristic
+
+
+def alt_path(binary_image, start, end, stats=None, landmarks=None):
+    # Without a landmark table (too large to build inside a request) this is
+    # plain Manhattan A* until build_routing_artifact has stored one
+    if stats is not None:
+        stats["landmarks"] = len(landmarks["landmark_pixel"]) if landmarks else 0
+    return grid_astar(binary_image, start, end, stats=stats, landmarks=landmarks)
@@ -0,0 +1,105 @@
+import cv2
+import networkx as nx
+import numpy as np
+from config import MULTIRES_SCALE_PERCENT, MULTIRES_CORRIDOR
+from .grid_search import check_endpoints, grid_astar, grid_bfs
+from .image_processing import resize_image
+
+
+def coarse_binary_image(binary_image, scale_percent=MULTIRES_SCALE_PERCENT):
+    # INTER_AREA averages each block; keep the cells that are mostly walkable
+    # so walls thinner than a block do not disappear
+    small = resize_image(binary_image, scale_percent)
+    return np.where(small >= 128, 255, 0).astype(np.uint8)
+
+
+def coarse_indices(size, coarse_size):
+    return np.minimum(np.arange(size) * coarse_size // size, coarse_size - 1)
+
+
+def corridor_mask(coarse_shape, coarse_path, corridor):
+    mask = np.zeros(coarse_shape, dtype=np.uint8)
+    rows, cols = zip(*coarse_path)
+    mask[list(rows), list(cols)] = 255
+    kernel = np.ones((2 * corridor + 1, 2 * corridor + 1), dtype=np.uint8)
+    return cv2.dilate(mask, kernel)
+
+
+def multires_path(
+    binary_image,
+    start,
+    end,
+    stats=None,
+    scale_percent=MULTIRES_SCALE_PERCENT,
+    corridor=MULTIRES_CORRIDOR,
+    compare_exact=False,
+):
+    """Search a downsampled map first, then refine at full resolution inside
+    a corridor around the coarse path. Falls back to a full search when the
+    corridor does not connect start and end.
+
+    stats gets the coarse and refined lengths, whether the fallback ran and,
+    with compare_exact, the exact length and relative suboptimality.
+    """
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+    stats = {} if stats is None else stats
+
+    rows, cols = binary_image.shape
+    path = None
+    # Images too small to downsample go straight to the full search
+    if min(rows, cols) * scale_percent >= 100:
+        path = coarse_to_fine(binary_image, start, end, stats, scale_percent, corridor)
+    stats["fallback"] = path is None
+    if path is None:
+        path = grid_astar(binary_image, start, end, stats=stats)
+
+    stats["length"] = len(path)
+    if compare_exact:
+        exact_length = len(grid_bfs(binary_image, start, end))
+        stats["exact_length"] = exact_length
+        stats["suboptimality"] = (len(path) - exact_length) / max(exact_length - 1, 1)
+    return path
+
+
+def coarse_to_fine(binary_image, start, end, stats, scale_percent, corridor):
+    # Returns None when the corridor does not connect start and end
+    rows, cols = binary_image.shape
+    coarse = coarse_binary_image(binary_image, scale_percent)
+    row_index = coarse_indices(rows, coarse.shape[0])
+    col_index = coarse_indices(cols, coarse.shape[1])
+    coarse_start = (int(row_index[start[0]]), int(col_index[start[1]]))
+    coarse_end = (int(row_index[end[0]]), int(col_index[end[1]]))
+    # Endpoints next to a wall can land in a mostly-wall cell
+    coarse[coarse_start] = 255
+    coarse[coarse_end] = 255
+
+    try:
+        coarse_path = grid_astar(coarse, coarse_start, coarse_end)
+        stats["coarse_length"] = len(coarse_path)
+
+        # Map the dilated corridor back to full resolution and only search
+        # inside its bounding box
+        mask = corridor_mask(coarse.shape, coarse_path, corridor)
+        mask_rows = np.flatnonzero(mask.any(axis=1))
+        mask_cols = np.flatnonzero(mask.any(axis=0))
+        top, bottom = np.searchsorted(row_index, [mask_rows[0], mask_rows[-1] + 1])
+        left, right = np.searchsorted(col_index, [mask_cols[0], mask_cols[-1] + 1])
+        full_mask = mask[
+            row_index[top:bottom, None], col_index[None, left:right]
+        ].astype(bool)
+        window = np.where(full_mask, binary_image[top:bottom, left:right], 0)
+        window = window.astype(np.uint8)
+
+        refine_stats = {}
+        local_path = grid_astar(
+            window,
+            (start[0] - top, start[1] - left),
+            (end[0] - top, end[1] - left),
+            stats=refine_stats,
+        )
+    except nx.NetworkXException:
+        return None
+    stats["expanded"] = refine_stats["expanded"]
+    return [(row + top, col + left) for row, col in local_path]
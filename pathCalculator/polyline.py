@@ -0,0 +1,86 @@
+import numpy as np
+from config import PATH_SIMPLIFY_TOLERANCE
+
+
+def collapse_collinear(points):
+    """Keep only the endpoints and the pixels where the step direction
+    changes; a straight run of any length becomes two points."""
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if len(points) < 3:
+        return points
+    steps = np.diff(points, axis=0)
+    turns = np.any(steps[1:] != steps[:-1], axis=1)
+    keep = np.concatenate(([True], turns, [True]))
+    return points[keep]
+
+
+def douglas_peucker(points, tolerance=PATH_SIMPLIFY_TOLERANCE):
+    """Drop points closer than tolerance pixels to the segment joining the
+    points kept around them."""
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first].astype(float), points[last].astype(float)
+        inner = points[first + 1 : last].astype(float)
+        segment = end - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(*(inner - start).T)
+        else:
+            offsets = inner - start
+            distances = (
+                np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+            )
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def simplify_path(path, tolerance=PATH_SIMPLIFY_TOLERANCE):
+    return douglas_peucker(collapse_collinear(path), tolerance)
+
+
+def encode_polyline(points):
+    """Encode (row, col) points as deltas in the printable varint format of
+    encoded polylines: 5 bits per character, zigzag signs, no precision
+    scaling since coordinates are whole pixels."""
+    chunks = []
+    previous = (0, 0)
+    for row, col in np.asarray(points, dtype=np.int64).reshape(-1, 2).tolist():
+        for delta in (row - previous[0], col - previous[1]):
+            value = delta << 1 if delta >= 0 else ~(delta << 1)
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous = (row, col)
+    return "".join(chunks)
+
+
+def decode_polyline(encoded):
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0).tolist()
+
+
+def path_polyline(path, tolerance=PATH_SIMPLIFY_TOLERANCE):
+    return encode_polyline(simplify_path(path, tolerance))
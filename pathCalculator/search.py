@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+from config import DEFAULT_PATH_ENGINE
+from services import path_logs
+from .graph_utils import create_graph, shortest_path, extract_edges
+from .kernels import NUMBA_AVAILABLE, reachable_kernel
+from .grid_search import grid_astar, grid_bfs
+from .jps import jps_path, jps_plus_path
+from .hpa import hpa_path
+from .multires import multires_path
+from .skeleton import skeleton_path
+from .landmarks import alt_path, landmark_heuristic
+from .ch import ch_path
+
+
+def networkx_path(binary_image, start, end, stats=None, landmarks=None):
+    graph = create_graph(binary_image)
+    heuristic = None
+    if landmarks is not None:
+        heuristic = landmark_heuristic(landmarks, binary_image.shape[1])
+    if stats is not None:
+        stats["nodes"] = graph.number_of_nodes()
+        # astar_path evaluates the heuristic once per queued node
+        heuristic = counted(heuristic or math.dist, stats, "queued")
+    return shortest_path(graph, tuple(start), tuple(end), heuristic=heuristic)
+
+
+def counted(function, stats, key):
+    stats[key] = 0
+
+    def wrapper(*args):
+        stats[key] += 1
+        return function(*args)
+
+    return wrapper
+
+
+# Search engines selectable with the "engine" request parameter
+PATH_ENGINES = {
+    "networkx": networkx_path,
+    "grid": grid_astar,
+    "bfs": grid_bfs,
+    "jps": jps_path,
+    "jps_plus": jps_plus_path,
+    "hpa": hpa_path,
+    "multires": multires_path,
+    "skeleton": skeleton_path,
+    "alt": alt_path,
+    "ch": ch_path,
+}
+
+
+def find_path(
+    binary_image, start, end, engine=DEFAULT_PATH_ENGINE, stats=None, **options
+):
+    # options carries engine specific precomputed data, e.g. jump_table or hpa
+    if engine not in PATH_ENGINES:
+        raise ValueError(f"Unknown path engine: {engine}")
+    return PATH_ENGINES[engine](binary_image, start, end, stats=stats, **options)
+
+
+def warmup():
+    # Compile (or load from the on-disk numba cache) every kernel up front so
+    # the first path request of a fresh worker does not pay for it
+    if not NUMBA_AVAILABLE:
+        return
+    binary_image = np.full((3, 3), 255, dtype=np.uint8)
+    extract_edges(binary_image)
+    reachable_kernel(np.ones(9, dtype=np.bool_), 3, 3, 0)
+    for engine in PATH_ENGINES:
+        if engine != "networkx":
+            find_path(binary_image, (0, 0), (2, 2), engine)
+    path_logs("path engines ready=====>")
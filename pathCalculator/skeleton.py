@@ -0,0 +1,410 @@
+import heapq
+
+import networkx as nx
+import numpy as np
+from services import path_logs
+from .grid_search import check_endpoints, grid_astar, to_walkable, unwind_path
+from .hpa import to_csr
+from .kernels import njit, neighbor_index
+
+# 8-connected neighbourhood used to walk the skeleton
+SKELETON_OFFSETS = (
+    (-1, 0),
+    (-1, 1),
+    (0, 1),
+    (1, 1),
+    (1, 0),
+    (1, -1),
+    (0, -1),
+    (-1, -1),
+)
+
+
+@njit(cache=True)
+def thinning_kernel(image):
+    """Zhang-Suen thinning of a 0/1 uint8 image with a zero border, in place."""
+    rows, cols = image.shape
+    markers = np.empty(rows * cols, dtype=np.int64)
+    changed = True
+    while changed:
+        changed = False
+        for step in range(2):
+            count = 0
+            for r in range(1, rows - 1):
+                for c in range(1, cols - 1):
+                    if image[r, c] == 0:
+                        continue
+                    p2 = image[r - 1, c]
+                    p3 = image[r - 1, c + 1]
+                    p4 = image[r, c + 1]
+                    p5 = image[r + 1, c + 1]
+                    p6 = image[r + 1, c]
+                    p7 = image[r + 1, c - 1]
+                    p8 = image[r, c - 1]
+                    p9 = image[r - 1, c - 1]
+                    neighbors = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+                    if neighbors < 2 or neighbors > 6:
+                        continue
+                    transitions = (
+                        (p2 == 0 and p3 == 1)
+                        + (p3 == 0 and p4 == 1)
+                        + (p4 == 0 and p5 == 1)
+                        + (p5 == 0 and p6 == 1)
+                        + (p6 == 0 and p7 == 1)
+                        + (p7 == 0 and p8 == 1)
+                        + (p8 == 0 and p9 == 1)
+                        + (p9 == 0 and p2 == 1)
+                    )
+                    if transitions != 1:
+                        continue
+                    if step == 0 and (p2 * p4 * p6 != 0 or p4 * p6 * p8 != 0):
+                        continue
+                    if step == 1 and (p2 * p4 * p8 != 0 or p2 * p6 * p8 != 0):
+                        continue
+                    markers[count] = r * cols + c
+                    count += 1
+            for i in range(count):
+                r = markers[i] // cols
+                image[r, markers[i] - r * cols] = 0
+            if count > 0:
+                changed = True
+    return image
+
+
+@njit(cache=True)
+def bfs_to_mask_kernel(walkable, rows, cols, start, targets):
+    # BFS from start until the first pixel flagged in targets
+    n = rows * cols
+    parents = np.full(n, -1, dtype=np.int32)
+    seen = np.zeros(n, dtype=np.bool_)
+    queue = np.empty(n, dtype=np.int32)
+    seen[start] = True
+    queue[0] = start
+    head = 0
+    tail = 1
+    while head < tail:
+        index = queue[head]
+        head += 1
+        if targets[index]:
+            return index, parents
+        for k in range(4):
+            neighbor = neighbor_index(index, k, rows, cols)
+            if neighbor == -1 or not walkable[neighbor] or seen[neighbor]:
+                continue
+            seen[neighbor] = True
+            parents[neighbor] = index
+            queue[tail] = neighbor
+            tail += 1
+    return -1, parents
+
+
+def thin(binary_image):
+    padded = np.pad((binary_image == 255).astype(np.uint8), 1)
+    return thinning_kernel(padded)[1:-1, 1:-1].astype(bool)
+
+
+def skeleton_degree(skeleton):
+    padded = np.pad(skeleton.astype(np.uint8), 1)
+    rows, cols = skeleton.shape
+    degree = np.zeros(skeleton.shape, dtype=np.uint8)
+    for dr, dc in SKELETON_OFFSETS:
+        degree += padded[1 + dr : 1 + dr + rows, 1 + dc : 1 + dc + cols]
+    return np.where(skeleton, degree, 0)
+
+
+def bridge(polyline, walkable, cols):
+    # Turn an 8-connected pixel run into 4-connected steps; None if a
+    # diagonal step squeezes between two walls
+    result = [polyline[0]]
+    for a, b in zip(polyline, polyline[1:]):
+        ar, ac = divmod(a, cols)
+        br, bc = divmod(b, cols)
+        if ar != br and ac != bc:
+            if walkable[br * cols + ac]:
+                result.append(br * cols + ac)
+            elif walkable[ar * cols + bc]:
+                result.append(ar * cols + bc)
+            else:
+                return None
+        result.append(b)
+    return result
+
+
+def trace_edges(skeleton, walkable):
+    rows, cols = skeleton.shape
+    degree = skeleton_degree(skeleton)
+    is_node = skeleton & (degree != 2)
+    flat_skeleton = skeleton.ravel()
+    visited = np.zeros(rows * cols, dtype=bool)
+
+    def neighbors(index):
+        row, col = divmod(index, cols)
+        for dr, dc in SKELETON_OFFSETS:
+            nr, nc = row + dr, col + dc
+            if 0 <= nr < rows and 0 <= nc < cols and flat_skeleton[nr * cols + nc]:
+                yield nr * cols + nc
+
+    nodes = set(np.flatnonzero(is_node.ravel()).tolist())
+    polylines = []
+
+    def walk_from(node):
+        if next(neighbors(node), None) is None:
+            # Isolated pixel, e.g. the skeleton of a small blob
+            polylines.append([node])
+        for first in neighbors(node):
+            if first in nodes:
+                if node < first:
+                    polylines.append([node, first])
+                continue
+            if visited[first]:
+                continue
+            line = [node, first]
+            previous, current = node, first
+            while current not in nodes:
+                visited[current] = True
+                following = [p for p in neighbors(current) if p != previous]
+                if not following or visited[following[0]] and following[0] != node:
+                    break
+                previous, current = current, following[0]
+                line.append(current)
+            if current in nodes:
+                polylines.append(line)
+
+    for node in sorted(nodes):
+        walk_from(node)
+    # Closed loops have no junction; promote one pixel of each to a node
+    for index in np.flatnonzero(flat_skeleton & ~visited).tolist():
+        if index not in nodes and not visited[index]:
+            nodes.add(index)
+            walk_from(index)
+
+    bridged = []
+    for line in polylines:
+        line = bridge(line, walkable, cols)
+        if line is not None:
+            bridged.append(line)
+    return bridged
+
+
+def build_skeleton_graph(binary_image):
+    """Thin the walkable area into a graph of junctions joined by polylines.
+
+    Nodes are skeleton end points and junctions; each edge keeps its
+    4-connected pixel polyline and its length. Returns a dict of arrays that
+    can be stored with pack_arrays.
+    """
+    rows, cols = binary_image.shape
+    walkable = to_walkable(binary_image)
+    polylines = trace_edges(thin(binary_image), walkable)
+
+    endpoints = np.array(
+        [(line[0], line[-1]) for line in polylines], dtype=np.int64
+    ).reshape(-1, 2)
+    node_pixel = np.unique(endpoints)
+    edge_nodes = np.searchsorted(node_pixel, endpoints).astype(np.int32)
+    edge_weight = np.array([len(line) - 1 for line in polylines], dtype=np.int32)
+    poly_indptr = np.zeros(len(polylines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in polylines], out=poly_indptr[1:])
+    poly_pixels = np.array(
+        [p for line in polylines for p in line], dtype=np.int64
+    ).reshape(-1)
+
+    # Where each polyline pixel sits: sorted pixel -> (edge, offset)
+    point_edge = np.repeat(np.arange(len(polylines)), np.diff(poly_indptr))
+    point_offset = np.arange(len(poly_pixels)) - poly_indptr[point_edge]
+    order = np.argsort(poly_pixels, kind="stable")
+
+    edge_ids = np.arange(len(polylines), dtype=np.int64)
+    indptr, adj_edges, _ = to_csr(
+        np.concatenate((edge_nodes[:, 0], edge_nodes[:, 1])).astype(np.int64),
+        np.concatenate((edge_ids, edge_ids)),
+        np.concatenate((edge_weight, edge_weight)),
+        len(node_pixel),
+    )
+    path_logs(
+        f"build_skeleton_graph=====> {len(node_pixel)} nodes, {len(polylines)} edges"
+    )
+
+    return {
+        "meta": np.array([rows, cols], dtype=np.int64),
+        "node_pixel": node_pixel,
+        "edge_nodes": edge_nodes,
+        "edge_weight": edge_weight,
+        "poly_indptr": poly_indptr,
+        "poly_pixels": poly_pixels,
+        "point_pixel": poly_pixels[order],
+        "point_edge": point_edge[order].astype(np.int32),
+        "point_offset": point_offset[order].astype(np.int32),
+        "adj_indptr": indptr,
+        "adj_edges": adj_edges,
+    }
+
+
+def attach(walkable, shape, pixel, skeleton):
+    # Nearest skeleton pixel by walking distance, and the pixel path to it
+    rows, cols = shape
+    targets = np.zeros(rows * cols, dtype=np.bool_)
+    targets[skeleton["point_pixel"]] = True
+    found, parents = bfs_to_mask_kernel(walkable, rows, cols, pixel, targets)
+    if found == -1:
+        return None, None, None, []
+    position = np.searchsorted(skeleton["point_pixel"], found)
+    edge = int(skeleton["point_edge"][position])
+    offset = int(skeleton["point_offset"][position])
+    return int(found), edge, offset, unwind_path(parents, found, cols)
+
+
+def edge_polyline(skeleton, edge):
+    indptr = skeleton["poly_indptr"]
+    return skeleton["poly_pixels"][indptr[edge] : indptr[edge + 1]].tolist()
+
+
+def skeleton_search(skeleton, start_link, end_link):
+    """Dijkstra over the skeleton graph between two attachment points.
+
+    A link is (edge, offset). Returns (cost, route) where route is a list of
+    (edge, from_offset, to_offset) pieces to walk along polylines.
+    """
+    edge_nodes = skeleton["edge_nodes"]
+    edge_weight = skeleton["edge_weight"]
+    indptr = skeleton["adj_indptr"]
+    adj_edges = skeleton["adj_edges"]
+    start_edge, start_offset = start_link
+    end_edge, end_offset = end_link
+
+    START, GOAL = -1, -2
+    g_score = {START: 0}
+    parents = {START: None}
+    open_set = []
+    expanded = 0
+
+    def relax(node, cost, parent, piece):
+        if cost < g_score.get(node, cost + 1):
+            g_score[node] = cost
+            parents[node] = (parent, piece)
+            heapq.heappush(open_set, (cost, node))
+
+    def goal_pieces(node):
+        # From a graph node, walk along end_edge to the attachment point
+        u, v = edge_nodes[end_edge]
+        if node == u:
+            yield end_offset, (end_edge, 0, end_offset)
+        if node == v:
+            weight = int(edge_weight[end_edge])
+            yield weight - end_offset, (end_edge, weight, end_offset)
+
+    u, v = (int(x) for x in edge_nodes[start_edge])
+    weight = int(edge_weight[start_edge])
+    relax(u, start_offset, START, (start_edge, start_offset, 0))
+    relax(v, weight - start_offset, START, (start_edge, start_offset, weight))
+    if start_edge == end_edge:
+        relax(
+            GOAL,
+            abs(end_offset - start_offset),
+            START,
+            (start_edge, start_offset, end_offset),
+        )
+
+    closed = set()
+    while open_set:
+        cost, node = heapq.heappop(open_set)
+        if node in closed:
+            continue
+        closed.add(node)
+        expanded += 1
+        if node == GOAL:
+            break
+        if node == START:
+            continue
+        for extra, piece in goal_pieces(node):
+            relax(GOAL, cost + extra, node, piece)
+        for i in range(indptr[node], indptr[node + 1]):
+            edge = int(adj_edges[i])
+            a, b = (int(x) for x in edge_nodes[edge])
+            weight = int(edge_weight[edge])
+            if a == node:
+                relax(b, cost + weight, node, (edge, 0, weight))
+            if b == node:
+                relax(a, cost + weight, node, (edge, weight, 0))
+
+    if GOAL not in closed:
+        return None, [], expanded
+    route = []
+    node = GOAL
+    while node != START:
+        node, piece = parents[node]
+        route.append(piece)
+    route.reverse()
+    return g_score[GOAL], route, expanded
+
+
+def remove_loops(path):
+    # Walking out to the skeleton and back can revisit pixels; cut the detours
+    result = []
+    position = {}
+    for pixel in path:
+        if pixel in position:
+            for dropped in result[position[pixel] + 1 :]:
+                del position[dropped]
+            del result[position[pixel] + 1 :]
+            continue
+        position[pixel] = len(result)
+        result.append(pixel)
+    return result
+
+
+def skeleton_path(binary_image, start, end, stats=None, skeleton=None):
+    """Route along the skeleton graph: walk from start to the nearest skeleton
+    point, follow corridors and junctions, then walk off to end. Routes stay
+    near corridor centres and are not exact shortest paths. Falls back to a
+    full grid search when the skeleton does not connect the endpoints."""
+    start = (int(start[0]), int(start[1]))
+    end = (int(end[0]), int(end[1]))
+    check_endpoints(binary_image, start, end)
+    if skeleton is None:
+        skeleton = build_skeleton_graph(binary_image)
+    return route_on_skeleton(
+        binary_image,
+        start,
+        end,
+        stats,
+        skeleton,
+        lambda start_link, end_link: skeleton_search(skeleton, start_link, end_link),
+    )
+
+
+def route_on_skeleton(binary_image, start, end, stats, skeleton, search):
+    # Attach both endpoints, let search(start_link, end_link) return
+    # (cost, route, expanded) over the graph, then stitch the pixel path
+    rows, cols = (int(v) for v in skeleton["meta"])
+    if (rows, cols) != binary_image.shape:
+        raise ValueError("Skeleton graph was built for a different image size")
+
+    walkable = to_walkable(binary_image)
+    start_pixel = start[0] * cols + start[1]
+    end_pixel = end[0] * cols + end[1]
+    _, start_edge, start_offset, lead_in = attach(
+        walkable, (rows, cols), start_pixel, skeleton
+    )
+    _, end_edge, end_offset, lead_out = attach(
+        walkable, (rows, cols), end_pixel, skeleton
+    )
+    cost, route, expanded = None, [], 0
+    if start_edge is not None and end_edge is not None:
+        cost, route, expanded = search(
+            (start_edge, start_offset), (end_edge, end_offset)
+        )
+    if stats is not None:
+        stats["expanded"] = expanded
+        stats["skeleton_nodes"] = len(skeleton["node_pixel"])
+        stats["fallback"] = cost is None
+    if cost is None:
+        return grid_astar(binary_image, start, end)
+
+    path = list(lead_in)
+    for edge, a, b in route:
+        line = edge_polyline(skeleton, edge)
+        piece = line[a : b + 1] if a <= b else line[b : a + 1][::-1]
+        path.extend(divmod(p, cols) for p in piece[1:])
+    path.extend(reversed(lead_out[:-1]))
+    return remove_loops(path)
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+from config import SNAP_RADIUS
+
+
+def build_snap_index(binary_image):
+    """Nearest walkable pixel of every pixel, from distance-transform labels.
+
+    Stores offset[i] = nearest(i) - i, which is zero on walkable pixels and
+    compresses well. Returns a dict of arrays that can be stored with
+    pack_arrays.
+    """
+    rows, cols = binary_image.shape
+    walls = (binary_image != 255).astype(np.uint8)
+    walkable = np.flatnonzero(walls.ravel() == 0)
+    offset = np.zeros(rows * cols, dtype=np.int32)
+    if len(walkable):
+        _, labels = cv2.distanceTransformWithLabels(
+            walls, cv2.DIST_L2, 5, labelType=cv2.DIST_LABEL_PIXEL
+        )
+        # DIST_LABEL_PIXEL numbers the zero pixels 1..n in raster order
+        offset = (walkable[labels.ravel() - 1] - np.arange(rows * cols)).astype(
+            np.int32
+        )
+    return {
+        "meta": np.array([rows, cols, len(walkable)], dtype=np.int64),
+        "offset": offset,
+    }
+
+
+def snap_point(snap_index, point, max_radius=SNAP_RADIUS):
+    """Nearest walkable (row, col) to point and its distance, or None when
+    the point is outside the image or further than max_radius from open
+    space."""
+    rows, cols, walkable_count = (int(v) for v in snap_index["meta"])
+    row, col = int(point[0]), int(point[1])
+    if not walkable_count or not (0 <= row < rows and 0 <= col < cols):
+        return None
+    index = row * cols + col
+    snapped = divmod(index + int(snap_index["offset"][index]), cols)
+    distance = float(np.hypot(snapped[0] - row, snapped[1] - col))
+    if distance > max_radius:
+        return None
+    return snapped, distance
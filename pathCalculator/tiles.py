@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+from config import TILE_SIZE, TILE_FORMAT, TILE_QUALITY
+from pathCalculator.visualization import PATH_COLOR, PATH_THICKNESS
+
+ENCODE_PARAMS = {
+    "webp": cv2.IMWRITE_WEBP_QUALITY,
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,
+}
+
+
+def pyramid_levels(height, width, tile_size=TILE_SIZE):
+    """(height, width) of every pyramid level: level 0 is the full image and
+    each next level halves it, until the whole image fits in one tile."""
+    levels = [(height, width)]
+    while max(levels[-1]) > tile_size:
+        height, width = levels[-1]
+        levels.append((-(-height // 2), -(-width // 2)))
+    return levels
+
+
+def image_tiles(image, tile_size=TILE_SIZE):
+    # Yields (level, row, col, pixels) for every tile of the pyramid
+    level_image = image
+    for level, (height, width) in enumerate(
+        pyramid_levels(*image.shape[:2], tile_size)
+    ):
+        if level:
+            level_image = cv2.resize(
+                level_image, (width, height), interpolation=cv2.INTER_AREA
+            )
+        for top in range(0, height, tile_size):
+            for left in range(0, width, tile_size):
+                pixels = level_image[top : top + tile_size, left : left + tile_size]
+                yield level, top // tile_size, left // tile_size, pixels
+
+
+def encode_tile(pixels, fmt=TILE_FORMAT, quality=TILE_QUALITY):
+    _, encoded = cv2.imencode(f".{fmt}", pixels, [ENCODE_PARAMS[fmt], quality])
+    return encoded.tobytes()
+
+
+def path_tiles(path, tile_size=TILE_SIZE, thickness=PATH_THICKNESS, shape=None):
+    """Full resolution (row, col) tiles the drawn path touches.
+
+    Every segment is sampled at one pixel steps and each sample's square of
+    half side thickness is checked; shape (height, width) drops tiles past
+    the image edge.
+    """
+    points = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+    samples = [points[:1]]
+    for start, end in zip(points[:-1], points[1:]):
+        steps = max(int(np.abs(end - start).max()), 1)
+        fractions = np.arange(1, steps + 1)[:, None] / steps
+        samples.append(start + (end - start) * fractions)
+    samples = np.concatenate(samples)
+    tiles = set()
+    for offset in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+        corners = np.maximum(samples + np.array(offset) * thickness, 0)
+        if shape is not None:
+            corners = np.minimum(corners, np.array(shape[:2]) - 1)
+        tiles.update(map(tuple, (corners // tile_size).astype(int).tolist()))
+    return sorted(tiles)
+
+
+def tile_segments(path, row, col, tile_size=TILE_SIZE, thickness=PATH_THICKNESS):
+    # Segments drawn into a tile, as [[row, col], [row, col]] pairs relative
+    # to its top-left pixel
+    origin = np.array([row, col]) * tile_size
+    points = np.asarray(path, dtype=np.int64).reshape(-1, 2) - origin
+    if len(points) == 1:
+        points = np.repeat(points, 2, axis=0)
+    starts, ends = points[:-1], points[1:]
+    low = np.minimum(starts, ends) - thickness
+    high = np.maximum(starts, ends) + thickness
+    inside = np.all((high >= 0) & (low < tile_size), axis=1)
+    return np.stack([starts[inside], ends[inside]], axis=1).tolist()
+
+
+def render_path_tile(image, segments, row, col, tile_size=TILE_SIZE):
+    # The image tile with the given segments drawn on it; matches the same
+    # area of visualize_path to within a pixel on clipped diagonals
+    top, left = row * tile_size, col * tile_size
+    tile = image[top : top + tile_size, left : left + tile_size].copy()
+    if not tile.size:
+        # Past the image edge: nothing to draw on
+        return tile
+    lines = [
+        np.ascontiguousarray(np.asarray(segment, dtype=np.int32)[:, ::-1])
+        for segment in segments
+    ]
+    cv2.polylines(tile, lines, False, PATH_COLOR, thickness=PATH_THICKNESS)
+    return tile
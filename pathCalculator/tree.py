@@ -0,0 +1,61 @@
+import numpy as np
+from .grid_search import check_endpoints, to_walkable, unwind_path
+from .kernels import njit, neighbor_index
+
+
+@njit(cache=True)
+def bfs_resume_kernel(
+    walkable, rows, cols, distances, parents, queue, head, tail, targets
+):
+    """Continue a BFS whose state lives in the given arrays until the next
+    target pixel is dequeued. Returns (head, tail, target); target is -1 once
+    the queue is exhausted."""
+    while head < tail:
+        index = queue[head]
+        head += 1
+        for k in range(4):
+            neighbor = neighbor_index(index, k, rows, cols)
+            if neighbor == -1 or not walkable[neighbor] or distances[neighbor] != -1:
+                continue
+            distances[neighbor] = distances[index] + 1
+            parents[neighbor] = index
+            queue[tail] = neighbor
+            tail += 1
+        if targets[index]:
+            return head, tail, index
+    return head, tail, -1
+
+
+def shortest_path_tree(binary_image, start, targets, with_paths=False):
+    """Grow one shortest-path tree from start and yield (point, distance,
+    path) for each reachable target, nearest first, as the search reaches it.
+
+    targets is an iterable of (row, col); path is None unless with_paths.
+    The search stops once every target has been reached.
+    """
+    start = (int(start[0]), int(start[1]))
+    check_endpoints(binary_image, start, start)
+    rows, cols = binary_image.shape
+    walkable = to_walkable(binary_image)
+
+    target_mask = np.zeros(rows * cols, dtype=np.bool_)
+    for row, col in targets:
+        if 0 <= row < rows and 0 <= col < cols and walkable[row * cols + col]:
+            target_mask[row * cols + col] = True
+    remaining = int(target_mask.sum())
+
+    distances = np.full(rows * cols, -1, dtype=np.int32)
+    parents = np.full(rows * cols, -1, dtype=np.int32)
+    queue = np.empty(rows * cols, dtype=np.int32)
+    distances[start[0] * cols + start[1]] = 0
+    queue[0] = start[0] * cols + start[1]
+    head, tail = 0, 1
+    while remaining:
+        head, tail, index = bfs_resume_kernel(
+            walkable, rows, cols, distances, parents, queue, head, tail, target_mask
+        )
+        if index == -1:
+            return
+        remaining -= 1
+        path = unwind_path(parents, index, cols) if with_paths else None
+        yield divmod(int(index), cols), int(distances[index]), path
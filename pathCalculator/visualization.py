@@ -1,16 +1,69 @@
+import base64
 import cv2
+import numpy as np
+
+PATH_COLOR = (0, 0, 255)
+PATH_THICKNESS = 3
+
+# Route renderings that only cover the path, not the floor plan
+OVERLAY_FORMATS = ("png", "webp", "svg", "geojson")
+# "image" draws on the full floor plan, "tiles" only on the pyramid tiles the
+# route crosses, "polyline" renders nothing
+PATH_OUTPUTS = ("image", "tiles", "polyline") + OVERLAY_FORMATS
+
+
+def path_points(path):
+    # (row, col) pixels to the contiguous int32 (x, y) array cv2 draws
+    points = np.asarray(path, dtype=np.int32).reshape(-1, 2)[:, ::-1]
+    return np.ascontiguousarray(points)
 
 
 def visualize_path(image, path, is_original=True):
-    path_image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if not is_original else image.copy()
-    for i in range(len(path) - 1):
-        start = path[i]
-        end = path[i + 1]
-        cv2.line(path_image, (start[1], start[0]), (end[1], end[0]), (0, 0, 255), thickness=3)
+    path_image = (
+        cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if not is_original else image.copy()
+    )
+    cv2.polylines(
+        path_image, [path_points(path)], False, PATH_COLOR, thickness=PATH_THICKNESS
+    )
     return path_image
 
 
+def path_overlay(path, fmt="png", thickness=PATH_THICKNESS):
+    """Route alone, cropped to its bounding box plus the line width.
+
+    offset is the (row, col) of the overlay's top-left pixel in the floor
+    plan and size its (height, width). png and webp data is base64 with a
+    transparent background, svg is markup in overlay coordinates and
+    geojson a LineString in [x, y] floor plan pixels.
+    """
+    points = path_points(path)
+    origin = np.maximum(points.min(axis=0) - thickness, 0)
+    width, height = (points.max(axis=0) - origin + thickness + 1).tolist()
+    local = np.ascontiguousarray(points - origin)
+    overlay = {
+        "format": fmt,
+        "offset": [int(origin[1]), int(origin[0])],
+        "size": [height, width],
+    }
+    if fmt == "geojson":
+        overlay["data"] = {"type": "LineString", "coordinates": points.tolist()}
+    elif fmt == "svg":
+        coordinates = " ".join(f"{x},{y}" for x, y in local.tolist())
+        overlay["data"] = (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+            f'height="{height}" viewBox="0 0 {width} {height}">'
+            f'<polyline points="{coordinates}" fill="none" stroke="#ff0000" '
+            f'stroke-width="{thickness}" stroke-linejoin="round" '
+            f'stroke-linecap="round"/></svg>'
+        )
+    else:
+        canvas = np.zeros((height, width, 4), dtype=np.uint8)
+        cv2.polylines(canvas, [local], False, PATH_COLOR + (255,), thickness=thickness)
+        _, encoded = cv2.imencode(f".{fmt}", canvas)
+        overlay["data"] = base64.b64encode(encoded.tobytes()).decode()
+    return overlay
+
+
 def display_images(*images):
     for idx, img in enumerate(images):
         cv2.imshow(f"Image {idx + 1}", img)
-
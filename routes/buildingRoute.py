@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify
-from models import Building, User, Image
+from models import Building, Image
 from datetime import datetime, timezone, timedelta
-import jwt
-from config import TOKEN_SECRET_KEY
 from services.error import handle_errors
 from services import token_required, logs
+from services.auth import token_user
+from services.artifacts import delete_artifacts
+from services.path_cache import delete_paths
 
 # Create a Blueprint for Building routes
 building_bp = Blueprint("building", __name__)
@@ -15,14 +16,6 @@ building_bp = Blueprint("building", __name__)
 @handle_errors
 @token_required
 def create_building(current_user):
-    token = request.headers.get("Authorization")
-    if not token:
-        return jsonify({"message": "Token is missing"}), 401
-
-        # Decode the token
-    decoded_token = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_token.get("user_id")
-
     # Get building data from request
     data = request.get_json()
     name = data.get("name")
@@ -41,14 +34,6 @@ def create_building(current_user):
 @handle_errors
 @token_required
 def update_building(building_id, current_user):
-    token = request.headers.get("Authorization")
-    if not token:
-        return jsonify({"message": "Token is missing"}), 401
-
-    # Decode the token
-    decoded_token = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_token.get("user_id")
-
     # Retrieve the building by ID
     building = Building.objects(id=building_id, user=current_user).first()
     if not building:
@@ -78,17 +63,13 @@ def get_all_buildings():
     if not token:
         return jsonify({"message": "Token is missing"}), 401
 
-    # Decode the token
-    decoded_token = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_token.get("user_id")
-
-    # Retrieve the user information
-    user = User.objects(id=user_id).first()
+    # Resolve the user from the token (cached for a short time)
+    user = token_user(token)
     if not user:
         return jsonify({"message": "User not found"}), 404
 
     # Retrieve all buildings for the user
-    buildings = Building.objects(user=user)
+    buildings = Building.objects(user=user).only("id", "name")
     buildings_list = [
         {"id": str(building.id), "name": building.name} for building in buildings
     ]
@@ -103,23 +84,27 @@ def get_all_buildings_with_images():
     if not token:
         return jsonify({"message": "Token is missing"}), 401
 
-    # Decode the token
-    decoded_token = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_token.get("user_id")
-
-    # Retrieve the user information
-    user = User.objects(id=user_id).first()
+    # Resolve the user from the token (cached for a short time)
+    user = token_user(token)
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    # Retrieve all buildings for the user
-    buildings = Building.objects(user=user)
+    # Retrieve all buildings for the user, then the images of all of them in
+    # one query; references are kept as ids to avoid a lookup per document
+    buildings = {
+        building.id: building
+        for building in Building.objects(user=user).no_dereference()
+    }
+    images = Image.objects(building__in=list(buildings.values()))
+    images_by_building = {building_id: [] for building_id in buildings}
+    for image in images.light().no_dereference():
+        building = buildings[image.building.id]
+        images_by_building[building.id].append(image.to_dict(building=building))
+
     buildings_list = []
-    for building in buildings:
-        images = Image.objects(building=building)
-        images_list = [image.to_dict() for image in images]
+    for building_id, building in buildings.items():
         building_dict = building.to_dict()
-        building_dict["images"] = images_list
+        building_dict["images"] = images_by_building[building_id]
         buildings_list.append(building_dict)
 
     return jsonify({"buildings": buildings_list}), 200
@@ -133,21 +118,17 @@ def get_building(building_id):
     if not token:
         return jsonify({"message": "Token is missing"}), 401
 
-    # Decode the token
-    decoded_token = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-    user_id = decoded_token.get("user_id")
-
-    # Retrieve the user information
-    user = User.objects(id=user_id).first()
+    # Resolve the user from the token (cached for a short time)
+    user = token_user(token)
     if not user:
         return jsonify({"message": "User not found"}), 404
 
     # Retrieve the building by ID
-    building = Building.objects(id=building_id, user=user).first()
+    building = Building.objects(id=building_id, user=user).no_dereference().first()
     if not building:
         return jsonify({"message": "Building not found"}), 404
 
-    images = Image.objects(building=building)
+    images = Image.objects(building=building).light()
     images_list = [image.simple_dict() for image in images]
     building_dict = building.to_dict()
     building_dict["images"] = images_list
@@ -165,7 +146,11 @@ def delete_building(current_user, building_id):
     if not building:
         return jsonify({"message": "Building not found"}), 404
 
-    # Delete associated images
+    # Delete associated images and their routing data
+    for image in Image.objects(building=building).only("id", "image_file"):
+        delete_artifacts(image)
+        delete_paths(image)
+        image.delete_files()
     Image.objects(building=building).delete()
 
     # Delete the building
@@ -1,21 +1,49 @@
 import copy
+import hashlib
+import json
 from bson import Binary
-from flask import Blueprint, request, jsonify, send_file
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    request,
+    jsonify,
+    send_file,
+    stream_with_context,
+)
 import boto3
+from botocore.exceptions import ClientError
 import cv2
 import concurrent.futures
+import networkx as nx
 import numpy as np
 import requests
 from io import BytesIO
 from models import Building, Image, Anchor, Path
 from services import token_required, logs, handle_errors, detail_logs, path_logs
-from pathCalculator.graph_utils import create_graph, shortest_path, create_graph_origin
+from pathCalculator.search import find_path, PATH_ENGINES
 from pathCalculator.image_processing import (
     read_image,
     convert_to_grayscale,
     apply_threshold,
+    encode_binary_image,
+    decode_binary_image,
+)
+from pathCalculator.visualization import (
+    visualize_path,
+    path_overlay,
+    OVERLAY_FORMATS,
+    PATH_OUTPUTS,
+)
+from pathCalculator.polyline import decode_polyline
+from pathCalculator.tiles import (
+    image_tiles,
+    encode_tile,
+    pyramid_levels,
+    path_tiles,
+    tile_segments,
+    render_path_tile,
 )
-from pathCalculator import visualize_path
 from config import (
     ROBOFLOW_API_KEY,
     ROBOFLOW_UPLOAD_URL,
@@ -24,8 +52,37 @@ from config import (
     S3_KEY_ID,
     AWS_DEFAULT_REGION,
     S3_BUCKET,
+    DEFAULT_PATH_ENGINE,
+    DEFAULT_PATH_OUTPUT,
+    TILE_SIZE,
+    TILE_FORMAT,
+    SNAP_RADIUS,
+    ANCHOR_STREAM_THRESHOLD,
 )
 from services.roboflow import analysis, saveData
+from services.artifacts import (
+    engine_options,
+    delete_artifacts,
+    prepare_endpoints,
+    image_snap_index,
+    anchor_point,
+    build_image_anchor_matrix,
+    load_anchor_matrix,
+    build_engine_artifact,
+)
+from services.artifact_store import stored_arrays
+from services.cache import routing_cache
+from services.path_cache import (
+    path_key,
+    cached_path,
+    oriented_polyline,
+    store_path,
+    reuse_path,
+    delete_paths,
+)
+from pathCalculator.anchor_matrix import anchor_route
+from pathCalculator.snap import snap_point
+from pathCalculator.tree import shortest_path_tree
 from factory import celery
 from datetime import datetime, timezone
 import logging
@@ -184,6 +241,224 @@ def filter_text_in_roboflow_boxes(text_data, roboflow_boxes, image_width, image_
     return filtered_text
 
 
+def s3_object_key(s3_image_url):
+    return s3_image_url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
+
+
+def image_version(s3_key):
+    # The ETag changes whenever the object is overwritten
+    return s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)["ETag"].strip('"')
+
+
+def load_s3_image(image_doc, s3_image_url, version=None):
+    # Colour image and thresholded floor plan, cached in memory and in the
+    # local artifact directory per S3 object version; callers that already
+    # know the version pass it to skip the head request
+    s3_key = s3_object_key(s3_image_url)
+
+    def download():
+        image_stream = BytesIO()
+        s3_client.download_fileobj(S3_BUCKET, s3_key, image_stream)
+        image_array = np.frombuffer(image_stream.getvalue(), dtype=np.uint8)
+        image = (
+            cv2.imdecode(image_array, cv2.IMREAD_COLOR) if image_array.size else None
+        )
+        if image is None:
+            raise ValueError("Failed to decode image")
+        binary_image = apply_threshold(convert_to_grayscale(image), threshold_value=170)
+        return {"image": image, "binary_image": binary_image}
+
+    version = version or image_version(s3_key)
+    arrays = routing_cache.get_or_build(
+        (str(image_doc.id), version, "image"),
+        lambda: stored_arrays(image_doc.id, "image", version, download),
+    )
+    return arrays["image"], arrays["binary_image"]
+
+
+def stored_binary_image(image_doc):
+    # Binary image saved by get_binary_image, cached until it is replaced.
+    # Documents loaded with light() fetch the map only on a cache miss
+    def decode():
+        doc = image_doc
+        if not doc.has_binary_image():
+            doc = (
+                Image.objects(id=image_doc.id)
+                .only("binary_packed", "binary_shape", "binary_image")
+                .first()
+            )
+        if doc.binary_packed:
+            binary_image = decode_binary_image(doc.binary_packed, doc.binary_shape)
+        else:
+            binary_image = np.array(doc.binary_image, dtype=np.uint8)
+        return {"binary_image": binary_image}
+
+    version = image_doc.updatedAt.isoformat()
+    arrays = routing_cache.get_or_build(
+        (str(image_doc.id), version, "binary_image"),
+        lambda: stored_arrays(image_doc.id, "binary_image", version, decode),
+    )
+    return arrays["binary_image"]
+
+
+def stored_image(image_doc):
+    # Frame saved by get_binary_image, cached until it is replaced
+    def decode():
+        if image_doc.image_file:
+            data = np.frombuffer(image_doc.image_file.read(), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        else:
+            # Legacy frame bytes, excluded by light()
+            doc = Image.objects(id=image_doc.id).only("image_binary").first()
+            image = np.frombuffer(doc.image_binary, dtype=np.uint8)
+            image = image.reshape(image_doc.image_shape)
+        return {"image": image}
+
+    version = image_doc.updatedAt.isoformat()
+    arrays = routing_cache.get_or_build(
+        (str(image_doc.id), version, "frame"),
+        lambda: stored_arrays(image_doc.id, "frame", version, decode),
+    )
+    return arrays["image"]
+
+
+def load_binary_image(image_doc):
+    # Thresholded floor plan: the stored copy, or rebuilt from the S3 image
+    if image_doc.has_binary_image():
+        return stored_binary_image(image_doc)
+    return load_s3_image(image_doc, image_doc.url)[1]
+
+
+def upload_path_image(path_doc, frame):
+    # Floor plan with the route drawn on it, uploaded once per path
+    path_image = visualize_path(frame, decode_polyline(path_doc.polyline))
+    _, img_encoded = cv2.imencode(".jpg", path_image)
+    output_s3_key = f"processed_images/{path_doc.id}.jpg"
+    path_logs(f"calculate_path=====> Uploading path image to S3: {output_s3_key}")
+    s3_client.upload_fileobj(
+        BytesIO(img_encoded.tobytes()),
+        S3_BUCKET,
+        output_s3_key,
+        ExtraArgs={"ContentType": "image/jpeg"},
+    )
+    output_s3_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{output_s3_key}"
+    path_doc.update(set__url=output_s3_url, set__updatedAt=datetime.now(timezone.utc))
+    path_doc.url = output_s3_url
+    return output_s3_url
+
+
+def upload_tile(data, s3_key):
+    # Tile keys never change content, so clients and proxies may keep them
+    content_type = "image/jpeg" if TILE_FORMAT == "jpg" else f"image/{TILE_FORMAT}"
+    s3_client.upload_fileobj(
+        BytesIO(data),
+        S3_BUCKET,
+        s3_key,
+        ExtraArgs={
+            "ContentType": content_type,
+            "CacheControl": "public, max-age=31536000, immutable",
+        },
+    )
+    return f"https://{S3_BUCKET}.s3.amazonaws.com/{s3_key}"
+
+
+def tile_exists(s3_key):
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        return True
+    except ClientError:
+        return False
+
+
+def upload_path_tiles(image_doc, path, load_frame, shape=None):
+    # Full resolution tiles the route crosses, named by a hash of the frame,
+    # the tile position and the segments drawn on it: tiles shared with
+    # earlier routes are neither rendered nor uploaded again. shape is the
+    # floor plan's (height, width), read from the frame when not given
+    frame = None
+    if shape is None:
+        frame = load_frame()
+        shape = frame.shape
+    frame_id = f"{image_doc.id}:{image_doc.updatedAt.isoformat()}"
+    tiles = []
+    for row, col in path_tiles(path, shape=shape):
+        segments = tile_segments(path, row, col)
+        digest = hashlib.sha1(
+            json.dumps([frame_id, TILE_SIZE, TILE_FORMAT, row, col, segments]).encode()
+        ).hexdigest()
+        tiles.append((row, col, segments, f"path_tiles/{digest}.{TILE_FORMAT}"))
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        exists = list(executor.map(tile_exists, [tile[3] for tile in tiles]))
+        missing = [tile for tile, found in zip(tiles, exists) if not found]
+        skipped = set()
+        if missing:
+            if frame is None:
+                frame = load_frame()
+
+            def render(tile):
+                row, col, segments, s3_key = tile
+                pixels = render_path_tile(frame, segments, row, col)
+                if not pixels.size:
+                    return s3_key
+                upload_tile(encode_tile(pixels), s3_key)
+
+            skipped = set(executor.map(render, missing)) - {None}
+    # Tiles that could not be rendered have nothing to link to
+    tiles = [tile for tile in tiles if tile[3] not in skipped]
+    path_logs(
+        f"path tiles=====> {len(tiles)} tiles, {len(missing) - len(skipped)} rendered"
+    )
+
+    return {
+        "tile_size": TILE_SIZE,
+        "format": TILE_FORMAT,
+        "items": [
+            {
+                "row": row,
+                "col": col,
+                "url": f"https://{S3_BUCKET}.s3.amazonaws.com/{s3_key}",
+            }
+            for row, col, _, s3_key in tiles
+        ],
+    }
+
+
+def path_output(image_doc, path_doc, start_point, output, load_frame, shape=None):
+    # Response fields for an output mode: "image" needs the full frame and an
+    # S3 upload (once per path), "tiles" the frame only for tiles not stored
+    # yet (or for its shape when none is given), overlays are drawn from the
+    # polyline alone
+    result = {"polyline": oriented_polyline(path_doc, start_point)}
+    if output == "image":
+        result["path_image_url"] = path_doc.url or upload_path_image(
+            path_doc, load_frame()
+        )
+    elif output == "tiles":
+        result["tiles"] = upload_path_tiles(
+            image_doc, decode_polyline(path_doc.polyline), load_frame, shape
+        )
+    elif output in OVERLAY_FORMATS:
+        result["overlay"] = path_overlay(decode_polyline(result["polyline"]), output)
+    return result
+
+
+def request_snap_radius(data):
+    # "snap_radius" of a request body, or None when it is not a non-negative
+    # number
+    value = data.get("snap_radius", SNAP_RADIUS)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value if 0 <= value < float("inf") else None
+
+
+SNAP_RADIUS_ERROR = {"error": "snap_radius must be a non-negative number"}
+
+# Engines raise networkx errors (NetworkXNoPath, NodeNotFound) when the
+# snapped endpoints cannot be joined
+NO_PATH_ERROR = {"message": "No path found"}
+
+
 def decode_image(file_content):
     image = cv2.imdecode(np.frombuffer(file_content, np.uint8), cv2.IMREAD_COLOR)
     if image is None:
@@ -238,17 +513,41 @@ def upload_image(current_user):
     if not building:
         return jsonify({"error": "Building not found"}), 404
 
-    image = Image(
-        building=building,
-        type=request.form.get("type"),
-        url=s3_url,
-        floor=int(request.form.get("floor")),
-    )
+    # Re-uploading a file overwrites its S3 object: drop everything derived
+    # from the old content
+    for replaced in Image.objects(url=s3_url).only("id"):
+        delete_artifacts(replaced)
+        delete_paths(replaced)
+
+    # A retried upload of the same file keeps its Image, so saveData replaces
+    # the detections instead of storing them again under a new document
+    image = Image.objects(url=s3_url, building=building).first()
+    if image:
+        image.delete_files()
+        image.image_shape = []
+        image.image_binary = None
+        image.binary_packed = None
+        image.binary_shape = []
+        image.binary_image = []
+        image.tiles = {}
+    else:
+        image = Image(building=building, url=s3_url)
+    image.type = request.form.get("type")
+    image.floor = int(request.form.get("floor"))
     image.save()
 
+    try:
+        build_image_tiles.delay(str(image.id))
+    except Exception as e:
+        logs(f"Tile pyramid task error: {e}")
+
     # Upload to Roboflow
     if ROBOFLOW_FEATURE and roboflow_data:
         saveData(image, roboflow_data)
+        try:
+            compute_anchor_matrix.delay(str(image.id))
+        except Exception as e:
+            logs(f"Anchor matrix task error: {e}")
 
     return (
         jsonify(
@@ -278,6 +577,12 @@ def calculate_path(current_user):
     s3_image_url = data.get("s3_image_url")
     start_point = tuple(data.get("start_point"))
     end_point = tuple(data.get("end_point"))
+    engine = data.get("engine", DEFAULT_PATH_ENGINE)
+    output = data.get("output", DEFAULT_PATH_OUTPUT)
+    snap_radius = request_snap_radius(data)
+
+    if snap_radius is None:
+        return jsonify(SNAP_RADIUS_ERROR), 400
 
     if not start_point or not end_point:
         return jsonify({"error": "Start and end points are required"}), 400
@@ -285,109 +590,118 @@ def calculate_path(current_user):
     if not s3_image_url or not start_point or not end_point:
         return jsonify({"error": "Missing required parameters"}), 400
 
+    if engine not in PATH_ENGINES:
+        return jsonify({"error": f"Unknown path engine: {engine}"}), 400
+
+    if output not in PATH_OUTPUTS:
+        return jsonify({"error": f"Unknown path output: {output}"}), 400
+
     path_logs(
         f"calculate_path=====> Start point: {start_point}, End point: {end_point}"
     )
 
     try:
 
-        image_doc = Image.objects(url=s3_image_url).first()
+        image_doc = Image.objects(url=s3_image_url).light().first()
         if not image_doc:
             return jsonify({"error": "Image not found"}), 404
 
-        path_doc = Path.objects(
-            start=start_point,
-            end=end_point,
-            image=image_doc,
-        ).first()
+        # Stored indexes answer unreachable pairs before any download
+        prepared = prepare_endpoints(
+            image_doc, None, start_point, end_point, snap_radius
+        )
+        if prepared and prepared[1]:
+            endpoints, error = prepared
+            return jsonify({"error": error[0], "endpoints": endpoints}), error[1]
+    except Exception as e:
+        return jsonify({"image query error": str(e)}), 500
+
+    # Download and threshold the image, unless this worker already has it
+    try:
+        image = binary_image = None
+        version = image_version(s3_object_key(s3_image_url))
+        if prepared is None:
+            path_logs(f"calculate_path=====> Loading image: {s3_image_url}")
+            image, binary_image = load_s3_image(image_doc, s3_image_url, version)
+            prepared = prepare_endpoints(
+                image_doc, binary_image, start_point, end_point, snap_radius
+            )
+        endpoints, error = prepared
+        if error:
+            return jsonify({"error": error[0], "endpoints": endpoints}), error[1]
 
-        # download_and_process_image.delay(s3_image_url, start_point, end_point)
-        if path_doc and path_doc.url:
+        # Repeat queries, in either direction, reuse the stored route
+        key = path_key(
+            version, endpoints, engine, engine_options(engine, None, None, data)
+        )
+        path_doc = cached_path(image_doc, key)
+        if path_doc:
+            path_logs(f"calculate_path=====> cached path: {path_doc.id}")
+            rendered = path_output(
+                image_doc,
+                path_doc,
+                endpoints["start_point"],
+                output,
+                lambda: load_s3_image(image_doc, s3_image_url, version)[0],
+            )
             return (
                 jsonify(
                     {
                         "message": "Path calculated and saved successfully",
-                        "path_image_url": path_doc.url,
+                        **rendered,
+                        "endpoints": endpoints,
+                        "cached": True,
                     }
                 ),
                 200,
             )
-    except Exception as e:
-        return jsonify({"image query error": str(e)}), 500
-
-    # Download image from S3
-    try:
-        path_logs(f"calculate_path=====> Downloading image from S3: {s3_image_url}")
 
-        s3_key = s3_image_url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
-        image_stream = BytesIO()
-        s3_client.download_fileobj(S3_BUCKET, s3_key, image_stream)
-        if image_stream.getbuffer().nbytes == 0:
-            return jsonify({"error": "Downloaded image is empty"}), 500
-
-        path_logs(f"calculate_path=====> done downloading image from S3")
+        if image is None:
+            path_logs(f"calculate_path=====> Loading image: {s3_image_url}")
+            image, binary_image = load_s3_image(image_doc, s3_image_url, version)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-
-    path_logs(
-        f"calculate_pathss=====> Image stream size: {image_stream.getbuffer().nbytes} bytes"
-    )
-
-    image_stream.seek(0)
-    path_logs(f"calculate_path=====> Image seek")
-    image_array = np.frombuffer(image_stream.read(), dtype=np.uint8)
-    path_logs(f"calculate_path=====> Image start")
-    if image_array.size == 0:
-        return jsonify({"error": "Failed to decode image, empty buffer"}), 500
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-    path_logs(f"calculate_path=====> Image cv2 start")
-    if image is None:
-        return jsonify({"error": "Failed to decode image"}), 500
-
-    path_logs(f"calculate_path=====> Image done")
-
-    # Process image
-    gray_image = convert_to_grayscale(image)
-    binary_image = apply_threshold(gray_image, threshold_value=170)
     path_logs(f"calculate_path=====> Binary image shape: {binary_image.shape}")
 
-    # Create graph and calculate the shortest path
-    graph = create_graph(binary_image)
-    path_logs(f"Graph node====> {len(graph.nodes())}")
-    path = shortest_path(graph, start_point, end_point)
-    path_logs(f"calculate_path=====> shortest path: {len(path)}")
-
-    # Visualize path
-    path_image = visualize_path(image, path, is_original=True)
-    path_logs(f"calculate_path=====> Visualize path: {path_image.shape}")
-
-    # Save to memory
-    _, img_encoded = cv2.imencode(".jpg", path_image)
-    img_buffer = BytesIO(img_encoded.tobytes())
-    output_s3_key = f"processed_images/path_result.jpg"
-    path_logs(f"calculate_path=====> Uploading path image to S3: {output_s3_key}")
-
-    # Upload result back to S3
-    s3_client.upload_fileobj(
-        img_buffer, S3_BUCKET, output_s3_key, ExtraArgs={"ContentType": "image/jpeg"}
+    # Calculate the shortest path
+    search_stats = {}
+    options = engine_options(
+        engine, image_doc, binary_image, data, queue_artifact(image_doc, engine)
     )
-    output_s3_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{output_s3_key}"
-    path_logs(f"calculate_path=====> Uploaded path image to S3: {output_s3_url}")
-
-    if output_s3_url:
-        path_doc = Path(
-            start=start_point,
-            end=end_point,
-            url=output_s3_url,
-            image=image_doc,
+    try:
+        path = find_path(
+            binary_image,
+            endpoints["start_point"],
+            endpoints["end_point"],
+            engine,
+            stats=search_stats,
+            **options,
         )
-        path_doc.save()
+    except nx.NetworkXException as e:
+        path_logs(f"calculate_path=====> {e}")
+        return jsonify(NO_PATH_ERROR), 404
+    path_logs(f"calculate_path=====> shortest path: {len(path)} {search_stats}")
+
+    path_doc = Path(start=start_point, end=end_point, image=image_doc).save()
+    store_path(path_doc, key, path)
+
+    # Draw the path in the requested form
+    rendered = path_output(
+        image_doc,
+        path_doc,
+        endpoints["start_point"],
+        output,
+        lambda: image,
+        binary_image.shape,
+    )
 
     return (
         jsonify(
             {
                 "message": "Path calculated and saved successfully",
-                "path_image_url": output_s3_url,
+                **rendered,
+                "search_stats": search_stats,
+                "endpoints": endpoints,
             }
         ),
         200,
@@ -407,6 +721,12 @@ def calculate_path_v2(current_user):
     s3_image_url = data.get("s3_image_url")
     start_point = tuple(data.get("start_point"))
     end_point = tuple(data.get("end_point"))
+    engine = data.get("engine", DEFAULT_PATH_ENGINE)
+    output = data.get("output", DEFAULT_PATH_OUTPUT)
+    snap_radius = request_snap_radius(data)
+
+    if snap_radius is None:
+        return jsonify(SNAP_RADIUS_ERROR), 400
 
     if not start_point or not end_point:
         return jsonify({"error": "Start and end points are required"}), 400
@@ -414,169 +734,436 @@ def calculate_path_v2(current_user):
     if not s3_image_url or not start_point or not end_point:
         return jsonify({"error": "Missing required parameters"}), 400
 
+    if engine not in PATH_ENGINES:
+        return jsonify({"error": f"Unknown path engine: {engine}"}), 400
+
+    if output not in PATH_OUTPUTS:
+        return jsonify({"error": f"Unknown path output: {output}"}), 400
+
     path_logs(
         f"calculate_path=====> Start point: {start_point}, End point: {end_point}, image: {s3_image_url}"
     )
 
     try:
 
-        image_doc = Image.objects(url=s3_image_url).first()
+        image_doc = Image.objects(url=s3_image_url).light().first()
         if not image_doc:
             return jsonify({"error": "Image not found"}), 404
 
-        path_doc = Path.objects(
+        # With stored indexes the endpoints can be snapped here, and a route
+        # stored for them (in either direction) returned without a task
+        request_options = engine_options(engine, None, None, data)
+        version = image_version(s3_object_key(s3_image_url))
+        prepared = prepare_endpoints(
+            image_doc, None, start_point, end_point, snap_radius
+        )
+        if prepared and not prepared[1]:
+            endpoints = prepared[0]
+            key = path_key(version, endpoints, engine, request_options)
+            path_doc = cached_path(image_doc, key)
+            if path_doc and (path_doc.url or output != "image"):
+                rendered = path_output(
+                    image_doc,
+                    path_doc,
+                    endpoints["start_point"],
+                    output,
+                    lambda: load_s3_image(image_doc, s3_image_url, version)[0],
+                )
+                return (
+                    jsonify(
+                        {
+                            "message": "Path calculated and saved successfully",
+                            "path_doc": path_doc.to_dict(),
+                            **rendered,
+                            "endpoints": endpoints,
+                            "cached": True,
+                        }
+                    ),
+                    200,
+                )
+
+        path_doc = Path(
             start=start_point,
             end=end_point,
             image=image_doc,
-        ).first()
+        )
+        path_doc.save()
+
+        path_logs(
+            f"process_image new=====> Path doc ID: {str(path_doc.id)}, "
+            f"S3 Image URL: {s3_image_url}, "
+            f"Start Point: {start_point}, "
+            f"End Point: {end_point}"
+        )
+
+        path_dict = path_doc.to_dict()
+        task = process_image.delay(
+            path_dict,
+            s3_image_url,
+            start_point,
+            end_point,
+            engine,
+            request_options,
+            snap_radius,
+            output,
+            version,
+        )
+        path_logs(f"task=====> {task}")
+        return (
+            jsonify(
+                {
+                    "message": "Path calculated and saved successfully",
+                    "path_doc": path_doc.to_dict(),
+                    "task_id": task.id,
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        path_logs(f"e=====>{e}")
+        return jsonify({"image query error": str(e)}), 500
+
+
+@celery.task
+def process_image(
+    path_doc,
+    s3_image_url,
+    start_point,
+    end_point,
+    engine=DEFAULT_PATH_ENGINE,
+    request_options=None,
+    snap_radius=SNAP_RADIUS,
+    output=DEFAULT_PATH_OUTPUT,
+    version=None,
+):
+    # Download and threshold the image, unless this worker already has it.
+    # version is the S3 object version the request was keyed on
+    try:
+        logging.info(f"calculate_path=====> Loading image: {s3_image_url}")
+        image_doc = Image.objects(id=path_doc["image"]).light().first()
+        version = version or image_version(s3_object_key(s3_image_url))
+        image, binary_image = load_s3_image(image_doc, s3_image_url, version)
+        logging.info(f"calculate_path=====> Binary image shape: {binary_image.shape}")
+
+        endpoints, error = prepare_endpoints(
+            image_doc, binary_image, start_point, end_point, snap_radius
+        )
+        if error:
+            logging.info(f"calculate_path=====> {error[0]} {endpoints}")
+            return {
+                "status": "no_path",
+                "path_doc_id": path_doc["id"],
+                "error": error[0],
+                "endpoints": endpoints,
+            }
+
+        # Another request may have stored this route since the task was queued
+        key = path_key(version, endpoints, engine, request_options or {})
+        search_stats = {}
+        cached = cached_path(image_doc, key)
+        if cached:
+            stored = reuse_path(Path.objects(id=path_doc["id"]).first(), cached)
+        else:
+            # Calculate the shortest path
+            options = engine_options(
+                engine,
+                image_doc,
+                binary_image,
+                request_options,
+                queue_artifact(image_doc, engine),
+            )
+            try:
+                path = find_path(
+                    binary_image,
+                    endpoints["start_point"],
+                    endpoints["end_point"],
+                    engine,
+                    stats=search_stats,
+                    **options,
+                )
+            except nx.NetworkXException as e:
+                logging.info(f"calculate_path=====> {e}")
+                return {
+                    "status": "no_path",
+                    "path_doc_id": path_doc["id"],
+                    "error": NO_PATH_ERROR["message"],
+                    "endpoints": endpoints,
+                }
+            logging.info(
+                f"calculate_path=====> shortest path: {len(path)} {search_stats}"
+            )
+            stored = store_path(Path.objects(id=path_doc["id"]).first(), key, path)
+
+        # TODO: save & update related information in database (image & request)
+
+        rendered = path_output(
+            image_doc,
+            stored,
+            endpoints["start_point"],
+            output,
+            lambda: image,
+            binary_image.shape,
+        )
+        logging.info(f"calculate_path=====> Rendered path: {output}")
 
-        # download_and_process_image.delay(s3_image_url, start_point, end_point)
-        useCache = False
-        if path_doc and path_doc.url and useCache:
+        return {
+            "status": "success",
+            "path_doc_id": path_doc["id"],
+            "output_s3_url": rendered.get("path_image_url"),
+            **rendered,
+            "search_stats": search_stats,
+            "endpoints": endpoints,
+            "cached": bool(cached),
+        }
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Get an image with anchors by ID (GET request)
+@image_bp.route("/image/<image_id>", methods=["GET"])
+@token_required
+def get_image_with_anchors(current_user, image_id):
+    # ?full=true also returns the binary map
+    full = request.args.get("full", "").lower() == "true"
+    try:
+
+        images = Image.objects(id=image_id)
+        image = (images if full else images.light()).first()
+
+        if not image:
+            return jsonify({"error": "Image not found"}), 404
+
+        image_data = image.to_dict(full=full)
+        anchors = Anchor.objects(image=image).as_pymongo()
+        if anchors.count() <= ANCHOR_STREAM_THRESHOLD:
+            image_data["anchors"] = [Anchor.raw_dict(anchor) for anchor in anchors]
+            return jsonify({"image": image_data}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Large detection sets: stream the anchors array as the cursor yields it,
+    # serialised by the app's JSON provider like jsonify
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{"image": {'
+        for key, value in image_data.items():
+            yield f"{dumps(key)}: {dumps(value)}, "
+        yield '"anchors": ['
+        for index, anchor in enumerate(anchors):
+            yield ("," if index else "") + dumps(Anchor.raw_dict(anchor))
+        yield "]}}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@image_bp.route("/image/<image_id>/anchor_distances", methods=["POST"])
+@token_required
+def anchor_distances(current_user, image_id):
+    # One shortest-path tree from start_point to every anchor of the image,
+    # streamed as newline-delimited JSON in order of distance
+    data = request.get_json(silent=True) or {}
+    if "start_point" not in data:
+        return jsonify({"error": "Missing required parameters"}), 400
+    include_paths = bool(data.get("include_paths", False))
+    snap_radius = request_snap_radius(data)
+    if snap_radius is None:
+        return jsonify(SNAP_RADIUS_ERROR), 400
+
+    try:
+        image_doc = Image.objects(id=image_id).first()
+        if not image_doc:
+            return jsonify({"error": "Image not found"}), 404
+        if not image_doc.has_binary_image():
             return (
                 jsonify(
                     {
-                        "message": "Path calculated and saved successfully",
-                        "path_doc": path_doc.to_dict(),
-                        "path_image_url": path_doc.url,
+                        "error": "Binary image not found. Please run save_binary_image first"
                     }
                 ),
-                200,
-            )
-        else:
-            if not path_doc:
-                path_doc = Path(
-                    start=start_point,
-                    end=end_point,
-                    image=image_doc,
-                )
-                path_doc.save()
-
-            path_logs(
-                f"process_image new=====> Path doc ID: {str(path_doc.id)}, "
-                f"S3 Image URL: {s3_image_url}, "
-                f"Start Point: {start_point}, "
-                f"End Point: {end_point}"
+                400,
             )
 
-            path_dict = path_doc.to_dict()
-            task = process_image.delay(path_dict, s3_image_url, start_point, end_point)
-            path_logs(f"task=====> {task}")
+        binary_image = stored_binary_image(image_doc)
+        snap_index = image_snap_index(image_doc, binary_image)
+        start = snap_point(snap_index, data["start_point"], snap_radius)
+        if start is None:
             return (
                 jsonify(
                     {
-                        "message": "Path calculated and saved successfully",
-                        "path_doc": path_doc.to_dict(),
-                        "task_id": task.id,
+                        "error": f"No walkable pixel within {snap_radius} pixels of start point"
                     }
                 ),
-                200,
+                400,
             )
+
+        anchors = Anchor.objects(image=image_doc).only(
+            "id", "x", "y", "label", "classType"
+        )
+        targets = {}
+        unplaced = []
+        for anchor in anchors:
+            point = anchor_point(snap_index, anchor, snap_radius)
+            if point is None:
+                unplaced.append(anchor)
+            else:
+                targets.setdefault(point, []).append(anchor)
     except Exception as e:
-        path_logs(f"e=====>{e}")
-        return jsonify({"image query error": str(e)}), 500
+        return jsonify({"error": str(e)}), 500
 
+    def anchor_line(anchor, point=None, distance=None, path=None):
+        line = {
+            "anchor": str(anchor.id),
+            "label": anchor.label,
+            "classType": anchor.classType,
+            "point": point,
+            "distance": distance,
+        }
+        if include_paths:
+            line["path"] = path
+        return json.dumps(line) + "\n"
 
-@celery.task
-def process_image(path_doc, s3_image_url, start_point, end_point):
-    # Download image from S3
-    try:
-        logging.info(f"calculate_path=====> Downloading image from S3: {s3_image_url}")
+    def generate():
+        yield json.dumps(
+            {
+                "image": str(image_doc.id),
+                "start_point": start[0],
+                "anchors": sum(map(len, targets.values())) + len(unplaced),
+            }
+        ) + "\n"
+        for point, distance, path in shortest_path_tree(
+            binary_image, start[0], targets, with_paths=include_paths
+        ):
+            for anchor in targets.pop(point):
+                yield anchor_line(anchor, point, distance, path)
+        # Anchors in another region, or too far from open space
+        for anchor in [a for group in targets.values() for a in group] + unplaced:
+            yield anchor_line(anchor)
 
-        s3_key = s3_image_url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
-        image_stream = BytesIO()
-        s3_client.download_fileobj(S3_BUCKET, s3_key, image_stream)
-        if image_stream.getbuffer().nbytes == 0:
-            return jsonify({"error": "Downloaded image is empty"}), 500
+    path_logs(
+        f"anchor_distances=====> start: {start[0]}, anchors: {len(targets)} points"
+    )
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-        logging.info(f"calculate_path=====> done downloading image from S3")
 
-        logging.info(
-            f"calculate_path=====> Image stream size: {image_stream.getbuffer().nbytes} bytes"
-        )
+@celery.task
+def build_routing_artifact(image_id, engine):
+    image_doc = Image.objects(id=image_id).first()
+    if not image_doc:
+        return {"status": "error", "error": "Image not found"}
+    build_engine_artifact(engine, image_doc, load_binary_image(image_doc))
+    return {"status": "success", "image_id": image_id, "engine": engine}
 
-        image_stream.seek(0)
-        logging.info(f"calculate_path=====> Image seek")
-        image_array = np.frombuffer(image_stream.read(), dtype=np.uint8)
-        logging.info(f"calculate_path=====> image_array")
-        if image_array.size == 0:
-            return jsonify({"error": "Failed to decode image, empty buffer"}), 500
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        logging.info(f"calculate_path=====> cv2")
-        if image is None:
-            return jsonify({"error": "Failed to decode image"}), 500
 
-        # Process image
-        # gray_image = convert_to_grayscale(image)
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def queue_artifact(image_doc, engine):
+    # on_deferred callback for engine_options
+    def queue():
+        try:
+            build_routing_artifact.delay(str(image_doc.id), engine)
+        except Exception as e:
+            logs(f"Routing artifact task error: {e}")
 
-        logging.info(f"calculate_path=====> gray_image")
-        binary_image = apply_threshold(gray_image, threshold_value=170)
-        logging.info(f"calculate_path=====> Binary image shape: {binary_image.shape}")
+    return queue
 
-        # Create graph and calculate the shortest path
-        graph = create_graph_origin(binary_image)
-        logging.info(f"Graph nodes: {len(graph.nodes())}")
-        path = shortest_path(graph, start_point, end_point)
-        logging.info(f"calculate_path=====> shortest path: {len(path)}")
-
-        # Visualize path
-        path_image = visualize_path(image, path, is_original=True)
-        logging.info(f"calculate_path=====> Visualize path: {path_image.shape}")
-
-        # Save to memory
-        _, img_encoded = cv2.imencode(".jpg", path_image)
-        img_buffer = BytesIO(img_encoded.tobytes())
-        output_s3_key = f"processed_images/{path_doc}.jpg"
-        logging.info(
-            f"calculate_path=====> Uploading path image to S3: {output_s3_key}"
-        )
 
-        # Upload result back to S3
-        s3_client.upload_fileobj(
-            img_buffer,
-            S3_BUCKET,
-            output_s3_key,
-            ExtraArgs={"ContentType": "image/jpeg"},
-        )
-        output_s3_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{output_s3_key}"
-        logging.info(f"calculate_path=====> Uploaded path image to S3: {output_s3_url}")
+@celery.task
+def compute_anchor_matrix(image_id):
+    image_doc = Image.objects(id=image_id).first()
+    if not image_doc:
+        return {"status": "error", "error": "Image not found"}
+    matrix = build_image_anchor_matrix(image_doc, load_binary_image(image_doc))
+    return {
+        "status": "success",
+        "image_id": image_id,
+        "anchors": len(matrix["anchor_ids"]),
+    }
 
-        # TODO: save & update related information in database (image & request)
 
-        if output_s3_url:
-            Path.objects(id=path_doc["id"]).update_one(
-                set__url=output_s3_url,
-                set__updatedAt=datetime.now(timezone.utc),
-            )
+@celery.task
+def build_image_tiles(image_id):
+    image_doc = Image.objects(id=image_id).light().first()
+    if not image_doc:
+        return {"status": "error", "error": "Image not found"}
+    version = image_version(s3_object_key(image_doc.url))
+    if image_doc.tiles and image_doc.tiles.get("version") == version:
+        return {"status": "success", "image_id": image_id, "tiles": 0}
 
-        return {
-            "status": "success",
-            "path_doc_id": path_doc["id"],
-            "output_s3_url": output_s3_url,
+    frame = load_s3_image(image_doc, image_doc.url, version)[0]
+    prefix = f"tiles/{image_id}/{version}"
+
+    def upload(tile):
+        level, row, col, pixels = tile
+        upload_tile(encode_tile(pixels), f"{prefix}/{level}/{row}_{col}.{TILE_FORMAT}")
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        count = len(list(executor.map(upload, image_tiles(frame))))
+    image_doc.update(
+        set__tiles={
+            "url": f"https://{S3_BUCKET}.s3.amazonaws.com/{prefix}",
+            "version": version,
+            "tile_size": TILE_SIZE,
+            "format": TILE_FORMAT,
+            "levels": [list(level) for level in pyramid_levels(*frame.shape[:2])],
         }
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    )
+    return {"status": "success", "image_id": image_id, "tiles": count}
 
 
-# Get an image with anchors by ID (GET request)
-@image_bp.route("/image/<image_id>", methods=["GET"])
+@image_bp.route("/image/<image_id>/tiles", methods=["POST"])
 @token_required
-def get_image_with_anchors(current_user, image_id):
-    try:
+def queue_image_tiles(current_user, image_id):
+    # Builds the pyramid for images uploaded before tiles existed
+    image_doc = Image.objects(id=image_id).light().first()
+    if not image_doc:
+        return jsonify({"error": "Image not found"}), 404
+    task = build_image_tiles.delay(str(image_doc.id))
+    return jsonify({"message": "Tile pyramid is being built", "task_id": task.id}), 202
 
-        image = Image.objects(id=image_id).first()
 
-        if not image:
+@image_bp.route("/image/<image_id>/anchor_route", methods=["GET"])
+@token_required
+def get_anchor_route(current_user, image_id):
+    # Room-to-room distance and anchor sequence from the precomputed matrix
+    source_id = request.args.get("from")
+    target_id = request.args.get("to")
+    if not source_id or not target_id:
+        return jsonify({"error": "Missing required parameters"}), 400
+
+    try:
+        image_doc = Image.objects(id=image_id).light().first()
+        if not image_doc:
             return jsonify({"error": "Image not found"}), 404
 
-        anchors = Anchor.objects(image=image)
+        matrix = load_anchor_matrix(image_doc)
+        if matrix is None:
+            task = compute_anchor_matrix.delay(str(image_doc.id))
+            return (
+                jsonify(
+                    {
+                        "message": "Anchor distance matrix is being built",
+                        "task_id": task.id,
+                    }
+                ),
+                202,
+            )
 
-        image_data = image.to_dict()
-        image_data["anchors"] = [anchor.to_dict() for anchor in anchors]
-        image_data["building"] = image.building.to_dict()
-        # print(f"Image data: {image_data}")
-        return jsonify({"image": image_data}), 200
+        anchor_ids = matrix["anchor_ids"].tolist()
+        if source_id not in anchor_ids or target_id not in anchor_ids:
+            return jsonify({"error": "Anchor not found"}), 404
+        distance, route = anchor_route(
+            matrix, anchor_ids.index(source_id), anchor_ids.index(target_id)
+        )
+        return (
+            jsonify(
+                {
+                    "from": source_id,
+                    "to": target_id,
+                    "distance": distance,
+                    "anchors": [anchor_ids[i] for i in route],
+                }
+            ),
+            200,
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -586,12 +1173,15 @@ def get_image_with_anchors(current_user, image_id):
 @token_required
 def delete_image(current_user, image_id):
     # Retrieve the image by ID
-    image = Image.objects(id=image_id).first()
+    image = Image.objects(id=image_id).light().first()
     if not image:
         return jsonify({"error": "Image not found"}), 404
 
-    # Delete associated anchors
+    # Delete associated anchors and precomputed routing data
     Anchor.objects(image=image).delete()
+    delete_artifacts(image)
+    delete_paths(image)
+    image.delete_files()
 
     # Delete the image from S3
     # s3_key = image.url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
@@ -609,6 +1199,13 @@ def delete_image(current_user, image_id):
     )
 
 
+@image_bp.route("/routing_cache", methods=["GET"])
+@token_required
+def routing_cache_stats(current_user):
+    # Counters of the worker that served this request
+    return jsonify(routing_cache.stats()), 200
+
+
 @image_bp.route("/task_status/<task_id>", methods=["GET"])
 def task_status(task_id):
     task = process_image.AsyncResult(task_id)
@@ -654,7 +1251,7 @@ def get_binary_image(current_user):
         image_doc = Image.objects(id=image_id).first()
         if not image_doc:
             return jsonify({"error": "Image not found"}), 404
-        elif not image_doc.binary_image:
+        elif image_doc.has_binary_image():
             return (
                 jsonify(
                     {
@@ -665,7 +1262,7 @@ def get_binary_image(current_user):
                 200,
             )
         s3_image_url = image_doc.url
-        image_doc = Image.objects(url=s3_image_url).first()
+        image_doc = Image.objects(url=s3_image_url).light().first()
         if not image_doc:
             return jsonify({"error": "Image not found"}), 404
 
@@ -690,14 +1287,26 @@ def get_binary_image(current_user):
         binary_image = apply_threshold(gray_image, threshold_value=170)
 
         # Save binary image data to MongoDB
-        binary_image_list = binary_image.tolist()
-        image_binary = Binary(image.tobytes())
+        binary_packed, binary_shape = encode_binary_image(binary_image)
+        _, image_png = cv2.imencode(".png", image)
+        if image_doc.image_file:
+            image_doc.image_file.replace(image_png.tobytes(), content_type="image/png")
+        else:
+            image_doc.image_file.put(image_png.tobytes(), content_type="image/png")
+        # Raw update: keyword updates cannot set a FileField
         image_doc.update(
-            set__binary_image=binary_image_list,
-            set__image_binary=image_binary,
-            set__image_shape=image.shape,
-            set__updatedAt=datetime.now(timezone.utc),
+            __raw__={
+                "$set": {
+                    "binary_packed": Binary(binary_packed),
+                    "binary_shape": binary_shape,
+                    "image_file": image_doc.image_file.grid_id,
+                    "image_shape": list(image.shape),
+                    "updatedAt": datetime.now(timezone.utc),
+                },
+                "$unset": {"binary_image": "", "image_binary": ""},
+            }
         )
+        routing_cache.invalidate(image_doc.id)
 
         return (
             jsonify(
@@ -726,12 +1335,27 @@ def calculate_and_save_path(current_user):
         image_id = data.get("image_id")
         start_point = tuple(data.get("start_point"))
         end_point = tuple(data.get("end_point"))
-
-        image_doc = Image.objects(id=image_id).first()
+        engine = data.get("engine", DEFAULT_PATH_ENGINE)
+        output = data.get("output", DEFAULT_PATH_OUTPUT)
+        snap_radius = request_snap_radius(data)
+        if snap_radius is None:
+            return jsonify(SNAP_RADIUS_ERROR), 400
+        if engine not in PATH_ENGINES:
+            return jsonify({"error": f"Unknown path engine: {engine}"}), 400
+        if output not in PATH_OUTPUTS:
+            return jsonify({"error": f"Unknown path output: {output}"}), 400
+
+        image_doc = Image.objects(id=image_id).light().first()
         if not image_doc:
             return jsonify({"error": "Image not found"}), 404
 
-        if not image_doc.binary_image:
+        # light() keeps binary_shape, set with every packed map; only legacy
+        # list maps need a look at the excluded field
+        legacy_binary = {"_id": image_doc.id, "binary_image.0": {"$exists": True}}
+        if (
+            not image_doc.binary_shape
+            and not Image.objects(__raw__=legacy_binary).only("id").first()
+        ):
             return (
                 jsonify(
                     {
@@ -741,71 +1365,81 @@ def calculate_and_save_path(current_user):
                 400,
             )
 
-        path_doc = Path.objects(
-            start=start_point,
-            end=end_point,
-            image=image_doc,
-        ).first()
-
-        # download_and_process_image.delay(s3_image_url, start_point, end_point)
-        useCache = False
-        if path_doc and path_doc.url and useCache:
+        binary_image = stored_binary_image(image_doc)
+        endpoints, error = prepare_endpoints(
+            image_doc, binary_image, start_point, end_point, snap_radius
+        )
+        if error:
+            return jsonify({"error": error[0], "endpoints": endpoints}), error[1]
+
+        # Repeat queries, in either direction, reuse the stored route until the
+        # stored binary image is replaced
+        key = path_key(
+            image_doc.updatedAt.isoformat(),
+            endpoints,
+            engine,
+            engine_options(engine, None, None, data),
+        )
+        path_doc = cached_path(image_doc, key)
+        if path_doc:
+            rendered = path_output(
+                image_doc,
+                path_doc,
+                endpoints["start_point"],
+                output,
+                lambda: stored_image(image_doc),
+                binary_image.shape,
+            )
             return (
                 jsonify(
                     {
                         "message": "Path calculated and saved successfully",
                         "path_doc": path_doc.to_dict(),
-                        "path_image_url": path_doc.url,
+                        **rendered,
+                        "endpoints": endpoints,
+                        "cached": True,
                     }
                 ),
                 200,
             )
-        else:
-            if not path_doc:
-                path_doc = Path(
-                    start=start_point,
-                    end=end_point,
-                    image=image_doc,
-                )
-                path_doc.save()
-        # Create graph and calculate path
-        binary_image = np.array(image_doc.binary_image)
-        graph = create_graph_origin(binary_image)
-        path = shortest_path(graph, start_point, end_point)
-
-        # Visualize path
-        image_binary = image_doc.image_binary
-        image_shape = image_doc.image_shape
-        image = np.frombuffer(image_binary, dtype=np.uint8).reshape(image_shape)
-
-        path_image = visualize_path(image, path, is_original=True)
-        path_logs(f"calculate_path=====> Visualize path: {path_image.shape}")
-
-        # Save to memory
-        _, img_encoded = cv2.imencode(".jpg", path_image)
-        img_buffer = BytesIO(img_encoded.tobytes())
-        output_s3_key = f"processed_images/{path_doc}.jpg"
-        path_logs(f"calculate_path=====> Uploading path image to S3: {output_s3_key}")
-
-        # Upload result back to S3
-        s3_client.upload_fileobj(
-            img_buffer,
-            S3_BUCKET,
-            output_s3_key,
-            ExtraArgs={"ContentType": "image/jpeg"},
-        )
-        output_s3_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{output_s3_key}"
 
-        if output_s3_url:
-            path_doc.update(
-                set__url=output_s3_url,
-                set__updatedAt=datetime.now(timezone.utc),
+        # Calculate path
+        search_stats = {}
+        options = engine_options(
+            engine, image_doc, binary_image, data, queue_artifact(image_doc, engine)
+        )
+        try:
+            path = find_path(
+                binary_image,
+                endpoints["start_point"],
+                endpoints["end_point"],
+                engine,
+                stats=search_stats,
+                **options,
             )
+        except nx.NetworkXException as e:
+            path_logs(f"calculate_and_save_path=====> {e}")
+            return jsonify(NO_PATH_ERROR), 404
+        path_doc = Path(start=start_point, end=end_point, image=image_doc).save()
+        store_path(path_doc, key, path)
+
+        # Draw the path in the requested form
+        rendered = path_output(
+            image_doc,
+            path_doc,
+            endpoints["start_point"],
+            output,
+            lambda: stored_image(image_doc),
+            binary_image.shape,
+        )
         return (
             jsonify(
                 {
                     "message": "Path calculated and saved successfully",
                     "path_doc": path_doc.to_dict(),
+                    **rendered,
+                    "search_stats": search_stats,
+                    "endpoints": endpoints,
                 }
             ),
             200,
@@ -3,6 +3,8 @@ from models import User
 from datetime import datetime, timezone, timedelta
 import jwt
 from config import TOKEN_SECRET_KEY
+from services import token_required
+from services.auth import principal_cache
 
 
 # Create a Blueprint for User routes
@@ -94,3 +96,10 @@ def get_user_info():
         return jsonify({"message": "Invalid token"}), 401
     except Exception as e:
         return jsonify({"message": "An error occurred", "error": str(e)}), 500
+
+
+@user_bp.route("/user/principal_cache", methods=["GET"])
+@token_required
+def principal_cache_stats(current_user):
+    # Counters of the worker that served this request
+    return jsonify(principal_cache.stats()), 200
@@ -0,0 +1,67 @@
+import os
+import re
+import shutil
+import tempfile
+
+from config import ARTIFACT_DIR
+from pathCalculator.artifacts import load_array_dir, save_array_dir
+from services.utils import path_logs
+
+STAGING_PREFIX = ".tmp-"
+
+
+def version_dir(image_id, kind, version=None):
+    parts = [ARTIFACT_DIR, str(image_id), kind]
+    if version is not None:
+        parts.append(re.sub(r"[^\w.-]", "_", str(version)))
+    return os.path.join(*parts)
+
+
+def load_stored_arrays(image_id, kind, version):
+    directory = version_dir(image_id, kind, version)
+    if not os.path.isdir(directory):
+        return None
+    return load_array_dir(directory)
+
+
+def store_arrays(image_id, kind, version, arrays):
+    """Write the arrays of one image version and return them memory-mapped.
+
+    Files go to a staging directory that is renamed into place, so readers
+    never see a partial version. Older versions of the same kind are removed;
+    processes that still map them keep their copy until they let go.
+    """
+    kind_dir = version_dir(image_id, kind)
+    directory = version_dir(image_id, kind, version)
+    os.makedirs(kind_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=kind_dir)
+    try:
+        save_array_dir(staging, arrays)
+        os.rename(staging, directory)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        # Another worker stored the same version first
+        if not os.path.isdir(directory):
+            raise
+    for name in os.listdir(kind_dir):
+        path = os.path.join(kind_dir, name)
+        if path != directory and not name.startswith(STAGING_PREFIX):
+            shutil.rmtree(path, ignore_errors=True)
+    return load_array_dir(directory)
+
+
+def stored_arrays(image_id, kind, version, build):
+    # Arrays of this version from the local store, built and stored if missing
+    arrays = load_stored_arrays(image_id, kind, version)
+    if arrays is not None:
+        return arrays
+    arrays = build()
+    try:
+        return store_arrays(image_id, kind, version, arrays)
+    except OSError as e:
+        path_logs(f"artifact store error=====> {kind} {e}")
+        return arrays
+
+
+def remove_stored_arrays(image_id):
+    shutil.rmtree(os.path.join(ARTIFACT_DIR, str(image_id)), ignore_errors=True)
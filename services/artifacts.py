@@ -0,0 +1,229 @@
+import hashlib
+
+import numpy as np
+from models import Anchor, RoutingArtifact
+from pathCalculator.anchor_matrix import build_anchor_matrix
+from pathCalculator.artifacts import pack_arrays, unpack_arrays
+from pathCalculator.ch import build_contraction_hierarchy
+from pathCalculator.components import build_components, check_components
+from pathCalculator.hpa import build_hpa
+from pathCalculator.jps import build_jump_table
+from pathCalculator.landmarks import build_landmarks
+from pathCalculator.skeleton import build_skeleton_graph
+from pathCalculator.snap import build_snap_index, snap_point
+from config import HPA_CLUSTER_SIZE, SNAP_RADIUS, ALT_LANDMARKS
+from services.artifact_store import remove_stored_arrays, stored_arrays
+from services.cache import routing_cache, content_hash
+from services.utils import path_logs
+
+# engine -> (engine keyword / artifact kind, builder, build params)
+ENGINE_ARTIFACTS = {
+    "hpa": ("hpa", build_hpa, {"cluster_size": HPA_CLUSTER_SIZE}),
+    "skeleton": ("skeleton", build_skeleton_graph, {}),
+    "alt": ("landmarks", build_landmarks, {"count": ALT_LANDMARKS}),
+    "ch": ("hierarchy", build_contraction_hierarchy, {}),
+}
+
+# Artifacts too slow to build inside a request: while missing, the engine
+# runs on the listed engine's artifact and the caller queues the build
+DEFERRED_ARTIFACTS = {
+    "ch": "skeleton",
+    "alt": "grid",
+}
+
+# engine -> (engine keyword, builder) for structures quick enough to build
+# that they are only kept locally (worker cache and artifact directory),
+# never in the database
+CACHED_STRUCTURES = {
+    "jps_plus": ("jump_table", build_jump_table),
+}
+
+# engine -> request parameters forwarded to it
+ENGINE_REQUEST_OPTIONS = {
+    "multires": ("compare_exact",),
+}
+
+
+def load_artifact(image_doc, kind, params=None):
+    artifact = RoutingArtifact.objects(image=image_doc, kind=kind).first()
+    if not artifact or not artifact.data or artifact.params != (params or {}):
+        return None
+    # GridFS gives every stored version a new file id
+    version = str(artifact.data.grid_id)
+    return routing_cache.get_or_build(
+        (str(image_doc.id), version, kind),
+        lambda: stored_arrays(
+            image_doc.id, kind, version, lambda: unpack_arrays(artifact.data.read())
+        ),
+    )
+
+
+def save_artifact(image_doc, kind, arrays, params=None):
+    data = pack_arrays(arrays)
+    artifact = RoutingArtifact.objects(image=image_doc, kind=kind).first()
+    if artifact:
+        artifact.data.replace(data, content_type="application/x-npz")
+    else:
+        artifact = RoutingArtifact(image=image_doc, kind=kind)
+        artifact.data.put(data, content_type="application/x-npz")
+    artifact.params = params or {}
+    artifact.save()
+    version = str(artifact.data.grid_id)
+    routing_cache.put(
+        (str(image_doc.id), version, kind),
+        stored_arrays(image_doc.id, kind, version, lambda: arrays),
+    )
+    path_logs(f"save_artifact=====> {kind} {len(data)} bytes")
+    return artifact
+
+
+def get_or_build_artifact(image_doc, kind, build, params=None):
+    arrays = load_artifact(image_doc, kind, params)
+    if arrays is None:
+        arrays = build()
+        save_artifact(image_doc, kind, arrays, params)
+    return arrays
+
+
+def delete_artifacts(image_doc):
+    for artifact in RoutingArtifact.objects(image=image_doc):
+        if artifact.data:
+            artifact.data.delete()
+        artifact.delete()
+    routing_cache.invalidate(image_doc.id)
+    remove_stored_arrays(image_doc.id)
+
+
+def image_components(image_doc, binary_image):
+    return get_or_build_artifact(
+        image_doc, "components", lambda: build_components(binary_image)
+    )
+
+
+def image_snap_index(image_doc, binary_image):
+    return get_or_build_artifact(
+        image_doc, "snap", lambda: build_snap_index(binary_image)
+    )
+
+
+def prepare_endpoints(
+    image_doc, binary_image, start_point, end_point, snap_radius=SNAP_RADIUS
+):
+    """Snap both endpoints to walkable space and check they can be joined.
+
+    With binary_image None only stored indexes are used, and None is returned
+    when they are missing. Otherwise returns (endpoints, error): endpoints
+    holds the snapped points, snap distances and component labels; error is
+    a (message, HTTP status) pair when no route can exist.
+    """
+    if binary_image is None:
+        snap_index = load_artifact(image_doc, "snap")
+        components = load_artifact(image_doc, "components")
+        if snap_index is None or components is None:
+            return None
+    else:
+        snap_index = image_snap_index(image_doc, binary_image)
+        components = image_components(image_doc, binary_image)
+
+    endpoints = {"snap_distance": {}}
+    for name, point in (("start", start_point), ("end", end_point)):
+        snapped = snap_point(snap_index, point, snap_radius)
+        if snapped is None:
+            message = f"No walkable pixel within {snap_radius} pixels of {name} point"
+            return endpoints, (message, 400)
+        endpoints[f"{name}_point"] = snapped[0]
+        endpoints["snap_distance"][name] = round(snapped[1], 2)
+
+    endpoints["components"], error = check_components(
+        components, endpoints["start_point"], endpoints["end_point"]
+    )
+    return endpoints, error
+
+
+def anchor_point(snap_index, anchor, snap_radius=SNAP_RADIUS):
+    # Anchor centres are (x, y) image coordinates; paths use (row, col)
+    if anchor.x is None or anchor.y is None:
+        return None
+    snapped = snap_point(snap_index, (round(anchor.y), round(anchor.x)), snap_radius)
+    return snapped[0] if snapped else None
+
+
+def image_anchors(image_doc):
+    return list(
+        Anchor.objects(image=image_doc).only("id", "x", "y", "label").order_by("id")
+    )
+
+
+def anchor_signature(anchors):
+    digest = hashlib.sha1()
+    for anchor in anchors:
+        digest.update(f"{anchor.id}:{anchor.x}:{anchor.y};".encode())
+    return {"signature": digest.hexdigest()}
+
+
+def build_image_anchor_matrix(image_doc, binary_image, snap_radius=SNAP_RADIUS):
+    anchors = image_anchors(image_doc)
+    snap_index = image_snap_index(image_doc, binary_image)
+    matrix = build_anchor_matrix(
+        binary_image, [anchor_point(snap_index, a, snap_radius) for a in anchors]
+    )
+    matrix["anchor_ids"] = np.array([str(anchor.id) for anchor in anchors])
+    save_artifact(image_doc, "anchor_matrix", matrix, anchor_signature(anchors))
+    return matrix
+
+
+def load_anchor_matrix(image_doc):
+    # None when missing or built for a different set of anchors
+    return load_artifact(
+        image_doc, "anchor_matrix", anchor_signature(image_anchors(image_doc))
+    )
+
+
+def build_engine_artifact(engine, image_doc, binary_image):
+    kind, build, params = ENGINE_ARTIFACTS[engine]
+    arrays = build(binary_image, **params)
+    save_artifact(image_doc, kind, arrays, params)
+    return arrays
+
+
+def engine_options(
+    engine, image_doc, binary_image, request_data=None, on_deferred=None
+):
+    # Keyword arguments for find_path: request parameters the engine accepts
+    # and the precomputed data it needs for this image. on_deferred() is
+    # called when a deferred artifact is missing and should be queued.
+    options = {
+        name: request_data[name]
+        for name in ENGINE_REQUEST_OPTIONS.get(engine, ())
+        if request_data and name in request_data
+    }
+    if engine in CACHED_STRUCTURES and image_doc is not None:
+        kind, build = CACHED_STRUCTURES[engine]
+        version = content_hash(binary_image)
+        arrays = routing_cache.get_or_build(
+            (str(image_doc.id), version, kind),
+            lambda: stored_arrays(
+                image_doc.id, kind, version, lambda: {kind: build(binary_image)}
+            ),
+        )
+        options[kind] = arrays[kind]
+        return options
+    if engine not in ENGINE_ARTIFACTS or image_doc is None:
+        return options
+    kind, build, params = ENGINE_ARTIFACTS[engine]
+    if engine in DEFERRED_ARTIFACTS:
+        arrays = load_artifact(image_doc, kind, params)
+        if arrays is not None:
+            options[kind] = arrays
+            return options
+        if on_deferred:
+            on_deferred()
+        stand_in = engine_options(
+            DEFERRED_ARTIFACTS[engine], image_doc, binary_image, request_data
+        )
+        options.update(stand_in)
+        return options
+    options[kind] = get_or_build_artifact(
+        image_doc, kind, lambda: build(binary_image, **params), params
+    )
+    return options
@@ -1,8 +1,30 @@
 from functools import wraps
 from flask import request, jsonify
 import jwt
-from config import TOKEN_SECRET_KEY
+from config import TOKEN_SECRET_KEY, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
 from models import User
+from models.userModel import USER_CHANGE_HOOKS
+from services.cache import TTLCache
+
+# user id -> User, shared by every request handled by this process
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+USER_CHANGE_HOOKS.append(principal_cache.invalidate)
+
+
+def load_user(user_id):
+    user_id = str(user_id)
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = User.objects(id=user_id).first()
+        if user:
+            principal_cache.put(user_id, user)
+    return user
+
+
+def token_user(token):
+    # Raises jwt errors for bad tokens; None when the user does not exist
+    data = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
+    return load_user(data.get("user_id"))
 
 
 def token_required(f):
@@ -16,8 +38,9 @@ def token_required(f):
             return jsonify({"message": "Token is missing!"}), 401
 
         try:
-            data = jwt.decode(token, TOKEN_SECRET_KEY, algorithms=["HS256"])
-            current_user = User.objects.get(id=data["user_id"])
+            current_user = token_user(token)
+            if current_user is None:
+                raise User.DoesNotExist("User matching query does not exist.")
         except Exception as e:
             return jsonify({"message": "Invalid token", "error": str(e)}), 404
 
@@ -0,0 +1,157 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from config import ROUTING_CACHE_BYTES, ROUTING_CACHE_ENTRY_BYTES
+from services.utils import path_logs
+
+
+def cached_size(value):
+    # Approximate memory held by a cached value: array buffers plus whatever
+    # dicts, lists and tuples wrap them
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(cached_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(cached_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def content_hash(array):
+    return hashlib.blake2b(np.ascontiguousarray(array).data, digest_size=16).hexdigest()
+
+
+class RoutingCache:
+    """LRU cache of routing structures held by this worker process.
+
+    Keys are tuples whose first item is the image id, e.g.
+    (image_id, content_hash, kind), so everything built for an image can be
+    dropped with invalidate(). Entries are evicted least recently used first
+    once their total size exceeds max_bytes; values over max_entry_bytes are
+    returned without being kept. Cached values are shared between requests
+    and must not be modified.
+    """
+
+    def __init__(
+        self, max_bytes=ROUTING_CACHE_BYTES, max_entry_bytes=ROUTING_CACHE_ENTRY_BYTES
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value):
+        size = cached_size(value)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > min(self.max_bytes, self.max_entry_bytes):
+                return value
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                evicted, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+                path_logs(f"routing cache evict=====> {evicted} {evicted_size} bytes")
+        return value
+
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, build())
+        return value
+
+    def invalidate(self, image_id):
+        image_id = str(image_id)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == image_id]:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every request handled by this process
+routing_cache = RoutingCache()
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire ttl seconds after being stored."""
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= self.clock():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
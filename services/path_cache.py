@@ -0,0 +1,60 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from config import PATH_SIMPLIFY_TOLERANCE
+from models import Path
+from pathCalculator.polyline import path_polyline, encode_polyline, decode_polyline
+
+
+def path_key(version, endpoints, engine, options):
+    # Both directions share a key: the route is stored once, in the
+    # orientation it was computed, and reversed on the way out
+    pair = sorted([list(endpoints["start_point"]), list(endpoints["end_point"])])
+    payload = json.dumps(
+        [version, pair, engine, options, PATH_SIMPLIFY_TOLERANCE], sort_keys=True
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def cached_path(image_doc, key):
+    # Only finished paths count: polyline is set once the route has been
+    # found. url may still be empty when no floor plan image was drawn
+    return (
+        Path.objects(image=image_doc, key=key, polyline__ne=None)
+        .order_by("-updatedAt")
+        .first()
+    )
+
+
+def oriented_polyline(path_doc, start_point):
+    # Stored polyline, re-encoded to begin at start_point when needed
+    points = decode_polyline(path_doc.polyline)
+    if points and points[0] != [int(value) for value in start_point]:
+        return encode_polyline(points[::-1])
+    return path_doc.polyline
+
+
+def store_path(path_doc, key, path):
+    path_doc.update(
+        set__key=key,
+        set__polyline=path_polyline(path),
+        set__updatedAt=datetime.now(timezone.utc),
+    )
+    path_doc.reload()
+    return path_doc
+
+
+def reuse_path(path_doc, cached):
+    # Answer a pending request with a route found since it was queued
+    path_doc.update(
+        set__key=cached.key,
+        set__polyline=cached.polyline,
+        set__url=cached.url,
+        set__updatedAt=datetime.now(timezone.utc),
+    )
+    path_doc.reload()
+    return path_doc
+
+
+def delete_paths(image_doc):
+    Path.objects(image=image_doc).delete()
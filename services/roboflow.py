@@ -2,11 +2,12 @@ import requests
 import json
 import tempfile
 import time
+from datetime import datetime, timezone
 from config import ROBOFLOW_API_KEY, ROBOFLOW_MODEL
 
 # from roboflow import Roboflow
 from services.utils import logs, detail_logs
-from models import Anchor
+from models import Anchor, Image
 
 # rf = Roboflow(api_key=ROBOFLOW_API_KEY)
 # project = rf.workspace().project("indoor-map")
@@ -54,12 +55,8 @@ def saveData(image, roboflowData):
     imageWidth = roboflowData.get("image.width")
     imageHeight = roboflowData.get("image.height")
 
-    image.inferenceId = inferenceId
-    image.imageWidth = imageWidth
-    image.imageHeight = imageHeight
-    image.save()
-
-    predictions = roboflowData.get("predictions")
+    predictions = roboflowData.get("predictions") or []
+    anchors = []
     for prediction in predictions:
         # print("prediction====>", prediction)
         anchor = Anchor(
@@ -74,7 +71,55 @@ def saveData(image, roboflowData):
             detectionId=prediction.get("detection_id"),
             tagData=prediction.get("tags"),
         )
-        anchor.save()
+        anchor.validate()
+        anchors.append(anchor.to_mongo())
+
+    detection_ids = [anchor.get("detectionId") for anchor in anchors]
+    updatedAt = datetime.now(timezone.utc)
+    roboflow_anchors = {"image": image.id, "detectionId": {"$type": "string"}}
+    anchor_collection = Anchor._get_collection()
+    image_collection = Image._get_collection()
+
+    # Anchors and image metadata are written in one transaction, retried by
+    # with_transaction on transient errors. Detections already stored for the
+    # image are kept (with any edits); ones from an earlier inference of a
+    # re-uploaded file are replaced.
+    def write(session):
+        stored = set(
+            anchor_collection.distinct("detectionId", roboflow_anchors, session=session)
+        )
+        missing = [a for a in anchors if a.get("detectionId") not in stored]
+        if missing:
+            anchor_collection.insert_many(missing, session=session)
+        anchor_collection.delete_many(
+            {
+                "image": image.id,
+                "detectionId": {"$type": "string", "$nin": detection_ids},
+            },
+            session=session,
+        )
+        image_collection.update_one(
+            {"_id": image.id},
+            {
+                "$set": {
+                    "inferenceId": inferenceId,
+                    "imageWidth": imageWidth,
+                    "imageHeight": imageHeight,
+                    "updatedAt": updatedAt,
+                }
+            },
+            session=session,
+        )
+        return len(missing)
+
+    with anchor_collection.database.client.start_session() as session:
+        inserted = session.with_transaction(write)
+    logs(f"saveData: {inserted} of {len(anchors)} anchors inserted")
+
+    image.inferenceId = inferenceId
+    image.imageWidth = imageWidth
+    image.imageHeight = imageHeight
+    image.updatedAt = updatedAt
     return
 
 
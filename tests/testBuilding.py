@@ -7,7 +7,9 @@ from models import User, Building, Image
 import jwt
 from config import TOKEN_SECRET_KEY
 from mongoengine import connect, disconnect
+from mongoengine.context_managers import query_counter
 from utils.common import printMsg
+from services.auth import principal_cache
 from bson import ObjectId
 
 
@@ -123,6 +125,19 @@ class BuildingRoutesTestCase(unittest.TestCase):
 
         Building.objects(user=self.test_user).delete()
 
+    def test_token_user_is_cached_until_user_changes(self):
+        principal_cache.clear()
+        for _ in range(2):
+            response = self.client.get(
+                "/api/buildings", headers={"Authorization": self.valid_token}
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(principal_cache.get(str(self.test_user.id)))
+
+        self.test_user.status = "disabled"
+        self.test_user.save()
+        self.assertIsNone(principal_cache.get(str(self.test_user.id)))
+
     def test_get_building_by_id(self):
         # Create a building for the user
         building = Building(name="Building 1", user=self.test_user).save()
@@ -219,6 +234,48 @@ class BuildingRoutesTestCase(unittest.TestCase):
         Image.objects(id=image1.id).delete()
         Image.objects(id=image2.id).delete()
 
+    def test_buildings_with_images_query_count(self):
+        def add_building(name, floors):
+            building = Building(name=name, user=self.test_user).save()
+            for floor in range(floors):
+                Image(
+                    building=building,
+                    type="raw",
+                    url=f"http://example.com/{name}_{floor}.jpg",
+                    floor=floor,
+                ).save()
+
+        def listing_queries():
+            with query_counter() as counter:
+                response = self.client.get(
+                    "/api/buildings_with_images",
+                    headers={"Authorization": self.valid_token},
+                )
+                queries = int(counter)
+            self.assertEqual(response.status_code, 200)
+            return queries, response.json["buildings"]
+
+        # Measure with the principal already cached, so the user lookup is
+        # not counted in one listing and skipped in the other
+        principal_cache.clear()
+        listing_queries()
+        add_building("Building 0", 1)
+        single, _ = listing_queries()
+        for index in range(1, 5):
+            add_building(f"Building {index}", 2)
+        many, buildings = listing_queries()
+
+        # Buildings and images: independent of how many there are
+        self.assertEqual(single, many)
+        self.assertLessEqual(many, 2)
+        self.assertEqual(len(buildings), 5)
+        self.assertEqual(sum(len(b["images"]) for b in buildings), 9)
+        for building in buildings:
+            for image in building["images"]:
+                self.assertEqual(image["building"]["id"], building["id"])
+        for building in Building.objects(user=self.test_user):
+            Image.objects(building=building).delete()
+
     def test_update_building(self):
         # Create a building for the user
         building = Building(name="Building 1", user=self.test_user).save()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from services import artifact_store
+from services.cache import RoutingCache, TTLCache, content_hash
+
+
+class RoutingCacheTestCase(unittest.TestCase):
+    def test_evicts_least_recently_used_over_budget(self):
+        cache = RoutingCache(max_bytes=3000)
+        cache.put(("a", "v1", "image"), np.zeros(1000, dtype=np.uint8))
+        cache.put(("b", "v1", "image"), np.zeros(1000, dtype=np.uint8))
+        self.assertIsNotNone(cache.get(("a", "v1", "image")))
+        cache.put(("c", "v1", "image"), {"table": np.zeros(1500, dtype=np.uint8)})
+
+        self.assertIsNone(cache.get(("b", "v1", "image")))
+        self.assertIsNotNone(cache.get(("a", "v1", "image")))
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["bytes"], 2500)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_get_or_build_and_invalidate(self):
+        cache = RoutingCache(max_bytes=10_000)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return np.ones(100, dtype=np.uint8)
+
+        binary_image = np.full((4, 4), 255, dtype=np.uint8)
+        key = ("image-1", content_hash(binary_image), "jump_table")
+        cache.get_or_build(key, build)
+        cache.get_or_build(key, build)
+        self.assertEqual(len(builds), 1)
+
+        cache.put(("image-2", "v1", "image"), np.ones(10, dtype=np.uint8))
+        cache.invalidate("image-1")
+        self.assertEqual(cache.stats()["entries"], 1)
+        cache.get_or_build(key, build)
+        self.assertEqual(len(builds), 2)
+
+    def test_value_over_budget_is_not_kept(self):
+        cache = RoutingCache(max_bytes=100)
+        value = cache.put(("a", "v1", "image"), np.zeros(1000, dtype=np.uint8))
+        self.assertEqual(value.size, 1000)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_large_entry_does_not_evict_the_cache(self):
+        cache = RoutingCache(max_bytes=3000, max_entry_bytes=1000)
+        cache.put(("a", "v1", "image"), np.zeros(1000, dtype=np.uint8))
+        table = {"distances": np.zeros((8, 100), dtype=np.uint16)}
+        self.assertIs(cache.put(("a", "v1", "landmarks"), table), table)
+        self.assertIsNotNone(cache.get(("a", "v1", "image")))
+        self.assertEqual(cache.stats()["bytes"], 1000)
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_entries_expire_and_are_counted(self):
+        now = [0.0]
+        cache = TTLCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.put("a", "user-a")
+        self.assertEqual(cache.get("a"), "user-a")
+        now[0] = 10.0
+        self.assertIsNone(cache.get("a"))
+
+        cache.put("a", "user-a")
+        cache.put("b", "user-b")
+        cache.put("c", "user-c")
+        self.assertIsNone(cache.get("a"))
+        cache.invalidate("b")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "user-c")
+        self.assertEqual(
+            cache.stats(), {"entries": 1, "hits": 2, "misses": 3, "hit_rate": 0.4}
+        )
+
+
+class ArtifactStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.original_dir = artifact_store.ARTIFACT_DIR
+        artifact_store.ARTIFACT_DIR = self.directory
+
+    def tearDown(self):
+        artifact_store.ARTIFACT_DIR = self.original_dir
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_arrays_are_built_once_and_memory_mapped(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"distances": np.arange(12, dtype=np.uint16).reshape(3, 4)}
+
+        first = artifact_store.stored_arrays("image-1", "landmarks", "v1", build)
+        second = artifact_store.stored_arrays("image-1", "landmarks", "v1", build)
+        self.assertEqual(len(builds), 1)
+        self.assertIsInstance(second["distances"], np.memmap)
+        self.assertFalse(second["distances"].flags.writeable)
+        np.testing.assert_array_equal(first["distances"], second["distances"])
+
+    def test_new_version_replaces_old_one(self):
+        arrays = {"table": np.ones(4, dtype=np.int16)}
+        artifact_store.stored_arrays("image-1", "jump_table", "v1", lambda: arrays)
+        artifact_store.stored_arrays("image-1", "jump_table", "v2", lambda: arrays)
+        kind_dir = artifact_store.version_dir("image-1", "jump_table")
+        self.assertEqual(os.listdir(kind_dir), ["v2"])
+
+        artifact_store.remove_stored_arrays("image-1")
+        self.assertFalse(os.path.exists(kind_dir))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
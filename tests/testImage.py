@@ -3,14 +3,23 @@ import warnings
 import logging
 from flask import Flask
 from services.auth import token_required
-from routes.imageRoute import image_bp
-from models import User, Building, Image, Anchor, Tag
+from routes import imageRoute
+from services.roboflow import saveData
+from routes.imageRoute import image_bp, compute_anchor_matrix, stored_image
+from pathCalculator.image_processing import encode_binary_image
+from utils.migrate_binary_images import migrate, migrate_frames, dedupe_anchors
+from models import User, Building, Image, Anchor, Tag, Path
+from services.artifacts import delete_artifacts, save_artifact
+from services.path_cache import path_key, store_path
+from pathCalculator.polyline import decode_polyline
 import jwt
 from config import TOKEN_SECRET_KEY
-from mongoengine import connect, disconnect
+from mongoengine import connect, disconnect, NotUniqueError
 from io import BytesIO
 import os
+import json
 import time
+import numpy as np
 from config import (
     S3_BUCKET,
 )
@@ -292,7 +301,6 @@ class ImageRoutesTestCase(unittest.TestCase):
         Anchor.objects(id=anchor1.id).delete()
 
     def test_calculate_path_success(self):
-
         data = {
             "s3_image_url": f"https://{S3_BUCKET}.s3.amazonaws.com/images/ENG_Floor1_4.jpg",
             "start_point": [0, 0],
@@ -357,6 +365,135 @@ class ImageRoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn("error", response.json)
 
+    def test_calculate_path_unknown_engine(self):
+        data = {
+            "s3_image_url": f"https://{S3_BUCKET}.s3.amazonaws.com/images/ENG_Floor1_4.jpg",
+            "start_point": [0, 0],
+            "end_point": [0, 1],
+            "engine": "unknown",
+        }
+        response = self.client.post(
+            "/api/calculate_path",
+            headers={"Authorization": self.valid_token},
+            json=data,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown path engine", response.json["error"])
+
+    def test_calculate_path_invalid_snap_radius(self):
+        for snap_radius in ("abc", -1, None, True):
+            response = self.client.post(
+                "/api/calculate_path",
+                headers={"Authorization": self.valid_token},
+                json={
+                    "s3_image_url": f"https://{S3_BUCKET}.s3.amazonaws.com/images/ENG_Floor1_4.jpg",
+                    "start_point": [0, 0],
+                    "end_point": [0, 1],
+                    "snap_radius": snap_radius,
+                },
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("snap_radius", response.json["error"])
+
+    def test_anchor_distances(self):
+        binary_image = np.full((10, 20), 255, dtype=np.uint8)
+        binary_image[:, 10] = 0
+        binary_packed, binary_shape = encode_binary_image(binary_image)
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/anchor_distances.jpg",
+            floor=3,
+            binary_packed=binary_packed,
+            binary_shape=binary_shape,
+        ).save()
+        near = Anchor(image=image, x=3, y=4, label="near").save()
+        across = Anchor(image=image, x=15, y=4, label="across").save()
+
+        response = self.client.post(
+            f"/api/image/{image.id}/anchor_distances",
+            headers={"Authorization": self.valid_token},
+            json={"start_point": [0, 0], "include_paths": True},
+        )
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines[0]["anchors"], 2)
+        self.assertEqual(lines[1]["anchor"], str(near.id))
+        self.assertEqual(lines[1]["distance"], 7)
+        self.assertEqual(len(lines[1]["path"]), 8)
+        self.assertEqual(lines[2]["anchor"], str(across.id))
+        self.assertIsNone(lines[2]["distance"])
+        image.delete()
+
+    def test_anchor_route_from_matrix(self):
+        binary_image = np.full((10, 30), 255, dtype=np.uint8)
+        binary_image[:, 15] = 0
+        binary_image[5, 15] = 255
+        binary_packed, binary_shape = encode_binary_image(binary_image)
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/anchor_route.jpg",
+            floor=4,
+            binary_packed=binary_packed,
+            binary_shape=binary_shape,
+        ).save()
+        left = Anchor(image=image, x=2, y=5, label="left").save()
+        right = Anchor(image=image, x=28, y=5, label="right").save()
+
+        result = compute_anchor_matrix(str(image.id))
+        self.assertEqual(result["anchors"], 2)
+        response = self.client.get(
+            f"/api/image/{image.id}/anchor_route?from={left.id}&to={right.id}",
+            headers={"Authorization": self.valid_token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["distance"], 26)
+        self.assertEqual(response.json["anchors"], [str(left.id), str(right.id)])
+        image.delete()
+
+    def test_migrate_binary_images(self):
+        binary_image = [[255, 0, 255], [0, 255, 255]]
+        frame = np.arange(18, dtype=np.uint8).reshape(2, 3, 3)
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/legacy_binary.jpg",
+            floor=5,
+            binary_image=binary_image,
+            image_binary=frame.tobytes(),
+            image_shape=frame.shape,
+        ).save()
+
+        self.assertGreaterEqual(migrate(), 1)
+        self.assertGreaterEqual(migrate_frames(), 1)
+        image.reload()
+        self.assertEqual(image.binary_image, [])
+        self.assertEqual(image.binary_shape, [2, 3])
+        self.assertEqual(
+            bytes(image.binary_packed), encode_binary_image(np.array(binary_image))[0]
+        )
+        self.assertIsNone(image.image_binary)
+        np.testing.assert_array_equal(stored_image(image), frame)
+        image.delete_files()
+        image.delete()
+
+    def test_dedupe_anchors_before_unique_index(self):
+        collection = Anchor._get_collection()
+        collection.drop_index([("image", 1), ("detectionId", 1)])
+        documents = [
+            {"image": self.test_image.id, "detectionId": "dup", "x": index}
+            for index in range(3)
+        ]
+        collection.insert_many(documents)
+
+        self.assertEqual(dedupe_anchors(), 2)
+        anchors = Anchor.objects(image=self.test_image, detectionId="dup")
+        self.assertEqual([anchor.x for anchor in anchors], [0])
+        with self.assertRaises(NotUniqueError):
+            Anchor(image=self.test_image, detectionId="dup").save()
+        anchors.delete()
+
     def test_get_image_with_anchors(self):
         response = self.client.get(
             f"/api/image/{self.test_image.id}",
@@ -366,6 +503,202 @@ class ImageRoutesTestCase(unittest.TestCase):
         self.assertIn("image", response.json)
         self.assertEqual(response.json["image"]["url"], self.test_image.url)
 
+    def test_get_image_light_and_full(self):
+        binary_packed, binary_shape = encode_binary_image(
+            np.full((4, 6), 255, dtype=np.uint8)
+        )
+        self.test_image.update(
+            set__binary_packed=binary_packed, set__binary_shape=binary_shape
+        )
+
+        response = self.client.get(
+            f"/api/image/{self.test_image.id}",
+            headers={"Authorization": self.valid_token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("binary_packed", response.json["image"])
+        self.assertEqual(len(response.json["image"]["anchors"]), 2)
+
+        response = self.client.get(
+            f"/api/image/{self.test_image.id}?full=true",
+            headers={"Authorization": self.valid_token},
+        )
+        self.assertEqual(response.json["image"]["binary_shape"], [4, 6])
+        self.assertIsNotNone(response.json["image"]["binary_packed"])
+
+        light = Image.objects(id=self.test_image.id).light().first()
+        self.assertIsNone(light.binary_packed)
+
+    def test_get_image_streams_large_anchor_sets(self):
+        url = f"/api/image/{self.test_image.id}"
+        headers = {"Authorization": self.valid_token}
+        listed = self.client.get(url, headers=headers).json["image"]
+
+        threshold = imageRoute.ANCHOR_STREAM_THRESHOLD
+        imageRoute.ANCHOR_STREAM_THRESHOLD = 1
+        try:
+            response = self.client.get(url, headers=headers)
+        finally:
+            imageRoute.ANCHOR_STREAM_THRESHOLD = threshold
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        streamed = json.loads(response.data)["image"]
+        self.assertEqual(streamed, listed)
+        self.assertEqual(
+            sorted(anchor["id"] for anchor in streamed["anchors"]),
+            sorted([str(self.test_anchor1.id), str(self.test_anchor2.id)]),
+        )
+        self.assertEqual(streamed["anchors"][0]["image"], str(self.test_image.id))
+
+    def test_save_roboflow_data_is_idempotent(self):
+        predictions = [
+            {
+                "x": 10 * index,
+                "y": 20,
+                "width": 5,
+                "height": 5,
+                "confidence": 0.9,
+                "class": "room",
+                "class_id": 1,
+                "detection_id": f"detection-{index}",
+                "tags": [
+                    {"text": f"R{index}", "x": 1, "y": 2, "width": 3, "height": 4}
+                ],
+            }
+            for index in range(3)
+        ]
+        roboflow_data = {"inference_id": "inference-1", "predictions": predictions}
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/roboflow.jpg",
+            floor=6,
+        ).save()
+
+        saveData(image, roboflow_data)
+        # A retried save stores nothing twice
+        saveData(image, roboflow_data)
+
+        anchors = Anchor.objects(image=image).order_by("detectionId")
+        self.assertEqual(anchors.count(), 3)
+        self.assertEqual(anchors[2].tagData[0].text, "R2")
+        self.assertEqual(Image.objects(id=image.id).first().inferenceId, "inference-1")
+
+        # A re-uploaded file's new inference replaces the old detections but
+        # keeps manually placed anchors
+        Anchor(image=image, label="manual").save()
+        predictions[0]["detection_id"] = "detection-new"
+        saveData(image, {"inference_id": "inference-2", "predictions": predictions})
+        self.assertEqual(
+            sorted(Anchor.objects(image=image).scalar("detectionId"), key=str),
+            [None, "detection-1", "detection-2", "detection-new"],
+        )
+        self.assertEqual(Image.objects(id=image.id).first().inferenceId, "inference-2")
+        Anchor.objects(image=image).delete()
+        image.delete()
+
+    def test_calculate_and_save_path_engine_no_path(self):
+        binary_image = np.full((5, 5), 255, dtype=np.uint8)
+        binary_image[:, 2] = 0
+        binary_packed, binary_shape = encode_binary_image(binary_image)
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/no_path.jpg",
+            floor=7,
+            binary_packed=binary_packed,
+            binary_shape=binary_shape,
+        ).save()
+        # A stale component index lets the pair through to the engine
+        save_artifact(
+            image,
+            "components",
+            {
+                "labels": np.ones((5, 5), dtype=np.uint16),
+                "count": np.array([1], dtype=np.int64),
+            },
+        )
+
+        response = self.client.post(
+            "/api/calculate_and_save_path",
+            headers={"Authorization": self.valid_token},
+            json={
+                "image_id": str(image.id),
+                "start_point": [0, 0],
+                "end_point": [0, 4],
+                "engine": "grid",
+            },
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json, {"message": "No path found"})
+        self.assertEqual(Path.objects(image=image).count(), 0)
+        delete_artifacts(image)
+        image.delete()
+
+    def test_calculate_and_save_path_reuses_reverse_route(self):
+        binary_packed, binary_shape = encode_binary_image(
+            np.full((5, 5), 255, dtype=np.uint8)
+        )
+        image = Image(
+            building=self.test_building,
+            type="raw",
+            url="http://example.com/path_cache.jpg",
+            floor=6,
+            binary_packed=binary_packed,
+            binary_shape=binary_shape,
+        ).save()
+        image.reload()
+        route = [(0, 0), (1, 1), (2, 2)]
+        endpoints = {"start_point": (0, 0), "end_point": (2, 2)}
+        key = path_key(image.updatedAt.isoformat(), endpoints, "grid", {})
+        stored = Path(start=[0, 0], end=[2, 2], image=image).save()
+        store_path(stored, key, route)
+        stored.update(set__url="http://example.com/path.jpg")
+
+        response = self.client.post(
+            "/api/calculate_and_save_path",
+            headers={"Authorization": self.valid_token},
+            json={
+                "image_id": str(image.id),
+                "start_point": [2, 2],
+                "end_point": [0, 0],
+                "engine": "grid",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json["cached"])
+        self.assertEqual(decode_polyline(response.json["polyline"]), [[2, 2], [0, 0]])
+        self.assertEqual(response.json["path_doc"]["id"], str(stored.id))
+        self.assertEqual(response.json["path_image_url"], "http://example.com/path.jpg")
+
+        response = self.client.post(
+            "/api/calculate_and_save_path",
+            headers={"Authorization": self.valid_token},
+            json={
+                "image_id": str(image.id),
+                "start_point": [0, 0],
+                "end_point": [2, 2],
+                "engine": "grid",
+                "output": "geojson",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("path_image_url", response.json)
+        self.assertEqual(
+            response.json["overlay"]["data"],
+            {"type": "LineString", "coordinates": [[0, 0], [2, 2]]},
+        )
+
+        # A new stored binary changes the key
+        image.save()
+        image.reload()
+        self.assertNotEqual(
+            path_key(image.updatedAt.isoformat(), endpoints, "grid", {}), key
+        )
+        delete_artifacts(image)
+        Path.objects(image=image).delete()
+        image.delete()
+
     def test_delete_image(self):
         # Create an image for the building
         image = Image(
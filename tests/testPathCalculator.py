@@ -0,0 +1,415 @@
+import base64
+import unittest
+import warnings
+from unittest import mock
+import cv2
+import networkx as nx
+import numpy as np
+from pathCalculator import grid_search, kernels
+from pathCalculator.graph_utils import extract_edges, create_graph_origin
+from pathCalculator.anchor_matrix import anchor_route, build_anchor_matrix
+from pathCalculator.artifacts import pack_arrays, unpack_arrays
+from pathCalculator.ch import build_contraction_hierarchy, ch_search
+from pathCalculator.components import build_components, check_components
+from pathCalculator.hpa import build_hpa
+from pathCalculator.image_processing import decode_binary_image, encode_binary_image
+from pathCalculator.landmarks import build_landmarks
+from pathCalculator.polyline import (
+    collapse_collinear,
+    decode_polyline,
+    encode_polyline,
+    simplify_path,
+)
+from pathCalculator.jps import build_jump_table
+from pathCalculator.search import find_path
+from pathCalculator.skeleton import build_skeleton_graph, skeleton_search
+from pathCalculator.snap import build_snap_index, snap_point
+from pathCalculator.tree import shortest_path_tree
+from pathCalculator.tiles import (
+    image_tiles,
+    path_tiles,
+    pyramid_levels,
+    render_path_tile,
+    tile_segments,
+)
+from pathCalculator.visualization import path_overlay, visualize_path
+
+
+def random_floor(rows, cols, wall_ratio=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    binary_image = np.where(rng.random((rows, cols)) < wall_ratio, 0, 255)
+    return binary_image.astype(np.uint8)
+
+
+def first_reachable_pair(binary_image):
+    graph = nx.grid_2d_graph(*binary_image.shape)
+    graph.remove_nodes_from(
+        [tuple(p) for p in np.argwhere(binary_image != 255).tolist()]
+    )
+    component = max(nx.connected_components(graph), key=len)
+    nodes = sorted(component)
+    return nodes[0], nodes[-1]
+
+
+def assert_valid_path(test, binary_image, path, start, end):
+    test.assertEqual(path[0], tuple(start))
+    test.assertEqual(path[-1], tuple(end))
+    for (r1, c1), (r2, c2) in zip(path, path[1:]):
+        test.assertEqual(abs(r1 - r2) + abs(c1 - c2), 1)
+        test.assertEqual(binary_image[r2, c2], 255)
+
+
+class PathEngineTestCase(unittest.TestCase):
+    def test_grid_matches_networkx(self):
+        for seed in range(5):
+            binary_image = random_floor(40, 60, seed=seed)
+            start, end = first_reachable_pair(binary_image)
+
+            expected = find_path(binary_image, start, end, "networkx")
+            for engine in ("grid", "bfs", "jps", "jps_plus"):
+                stats = {}
+                path = find_path(binary_image, start, end, engine, stats=stats)
+
+                assert_valid_path(self, binary_image, path, start, end)
+                self.assertEqual(len(path), len(expected))
+                self.assertGreater(stats["expanded"], 0)
+
+    def test_grid_no_path(self):
+        binary_image = np.full((10, 10), 255, dtype=np.uint8)
+        binary_image[:, 5] = 0
+        for engine in ("grid", "jps", "jps_plus"):
+            with self.assertRaises(nx.NetworkXNoPath):
+                find_path(binary_image, (0, 0), (0, 9), engine)
+
+    def test_grid_without_numba(self):
+        # Pure-Python A*, with and without a landmark table
+        binary_image = random_floor(30, 40, seed=1)
+        start, end = first_reachable_pair(binary_image)
+        expected = find_path(binary_image, start, end, "bfs")
+        landmarks = build_landmarks(binary_image, count=2)
+        with mock.patch.object(kernels, "NUMBA_AVAILABLE", False), mock.patch.object(
+            grid_search, "NUMBA_AVAILABLE", False
+        ):
+            for options in ({}, {"landmarks": landmarks}):
+                path = grid_search.grid_astar(binary_image, start, end, **options)
+                assert_valid_path(self, binary_image, path, start, end)
+                self.assertEqual(len(path), len(expected))
+
+    def test_jps_corridors(self):
+        binary_image = np.full((60, 90), 255, dtype=np.uint8)
+        binary_image[20:23, :80] = 0
+        binary_image[40:43, 10:] = 0
+        binary_image[:35, 50:52] = 0
+        binary_image[5:8, 50:52] = 255
+
+        expected = find_path(binary_image, (0, 0), (59, 89), "grid")
+        jump_table = build_jump_table(binary_image)
+        for engine, options in (("jps", {}), ("jps_plus", {"jump_table": jump_table})):
+            stats = {}
+            path = find_path(
+                binary_image, (0, 0), (59, 89), engine, stats=stats, **options
+            )
+            assert_valid_path(self, binary_image, path, (0, 0), (59, 89))
+            self.assertEqual(len(path), len(expected))
+            self.assertLess(stats["expanded"], len(expected))
+
+    def test_grid_endpoint_on_wall(self):
+        binary_image = np.full((10, 10), 255, dtype=np.uint8)
+        binary_image[0, 0] = 0
+        with self.assertRaises(nx.NodeNotFound):
+            find_path(binary_image, (0, 0), (9, 9), "grid")
+
+    def test_hpa_artifact_round_trip(self):
+        binary_image = random_floor(120, 150, wall_ratio=0.2, seed=3)
+        start, end = first_reachable_pair(binary_image)
+        hpa = unpack_arrays(pack_arrays(build_hpa(binary_image, cluster_size=16)))
+
+        expected = find_path(binary_image, start, end, "bfs")
+        stats = {}
+        path = find_path(binary_image, start, end, "hpa", stats=stats, hpa=hpa)
+
+        assert_valid_path(self, binary_image, path, start, end)
+        self.assertGreaterEqual(len(path), len(expected))
+        self.assertLessEqual(len(path), len(expected) * 1.5)
+        self.assertLess(stats["expanded"], stats["abstract_nodes"] + 2)
+
+    def test_alt_landmarks_cut_expansions(self):
+        # Long walls with openings at alternating ends
+        binary_image = np.full((120, 160), 255, dtype=np.uint8)
+        for row in range(10, 110, 20):
+            binary_image[row, :150] = 0
+            binary_image[row + 10, 10:] = 0
+        landmarks = unpack_arrays(pack_arrays(build_landmarks(binary_image, count=4)))
+        start, end = (0, 0), (119, 159)
+
+        grid_stats, alt_stats = {}, {}
+        expected = find_path(binary_image, start, end, "grid", stats=grid_stats)
+        path = find_path(
+            binary_image, start, end, "alt", stats=alt_stats, landmarks=landmarks
+        )
+        assert_valid_path(self, binary_image, path, start, end)
+        self.assertEqual(len(path), len(expected))
+        self.assertEqual(alt_stats["landmarks"], 4)
+        self.assertLess(alt_stats["expanded"], grid_stats["expanded"] / 2)
+
+        nx_stats, nx_alt_stats = {}, {}
+        find_path(binary_image, start, end, "networkx", stats=nx_stats)
+        nx_path = find_path(
+            binary_image,
+            start,
+            end,
+            "networkx",
+            stats=nx_alt_stats,
+            landmarks=landmarks,
+        )
+        self.assertEqual(len(nx_path), len(expected))
+        self.assertLess(nx_alt_stats["queued"], nx_stats["queued"])
+
+    def test_multires_refines_inside_corridor(self):
+        binary_image = np.full((200, 240), 255, dtype=np.uint8)
+        binary_image[60:68, :200] = 0
+        binary_image[130:138, 40:] = 0
+
+        stats = {}
+        path = find_path(
+            binary_image,
+            (5, 5),
+            (195, 235),
+            "multires",
+            stats=stats,
+            compare_exact=True,
+        )
+        assert_valid_path(self, binary_image, path, (5, 5), (195, 235))
+        self.assertFalse(stats["fallback"])
+        self.assertEqual(stats["length"], len(path))
+        self.assertLess(stats["suboptimality"], 0.05)
+
+    def test_multires_falls_back_when_corridor_blocked(self):
+        # A one pixel wall vanishes from the coarse map
+        binary_image = np.full((100, 100), 255, dtype=np.uint8)
+        binary_image[:99, 50] = 0
+
+        stats = {}
+        path = find_path(
+            binary_image, (0, 0), (0, 99), "multires", stats=stats, compare_exact=True
+        )
+        assert_valid_path(self, binary_image, path, (0, 0), (0, 99))
+        self.assertTrue(stats["fallback"])
+        self.assertEqual(stats["suboptimality"], 0)
+
+        # Too small to downsample at all
+        stats = {}
+        tiny = np.full((3, 3), 255, dtype=np.uint8)
+        path = find_path(tiny, (0, 0), (2, 2), "multires", stats=stats)
+        assert_valid_path(self, tiny, path, (0, 0), (2, 2))
+        self.assertTrue(stats["fallback"])
+
+    def test_skeleton_artifact_round_trip(self):
+        binary_image = np.full((60, 90), 0, dtype=np.uint8)
+        binary_image[5:25, 5:85] = 255
+        binary_image[35:55, 5:85] = 255
+        binary_image[25:35, 40:46] = 255
+
+        skeleton = unpack_arrays(pack_arrays(build_skeleton_graph(binary_image)))
+        for start, end in (((6, 6), (54, 84)), ((10, 80), (50, 10))):
+            stats = {}
+            path = find_path(
+                binary_image, start, end, "skeleton", stats=stats, skeleton=skeleton
+            )
+
+            assert_valid_path(self, binary_image, path, start, end)
+            self.assertEqual(len(path), len(set(path)))
+            self.assertFalse(stats["fallback"])
+            self.assertLess(stats["expanded"], len(skeleton["node_pixel"]) + 3)
+
+        with self.assertRaises(nx.NetworkXNoPath):
+            binary_image[25:35, 40:46] = 0
+            find_path(binary_image, (6, 6), (54, 84), "skeleton")
+
+    def test_contraction_hierarchy_matches_skeleton(self):
+        binary_image = random_floor(50, 70, wall_ratio=0.25, seed=5)
+        hierarchy = unpack_arrays(
+            pack_arrays(build_contraction_hierarchy(binary_image))
+        )
+        edge_weight = hierarchy["edge_weight"]
+        edges = range(0, len(edge_weight), 7)
+        for a, b in zip(edges, reversed(edges)):
+            start_link, end_link = (a, 0), (b, int(edge_weight[b]) // 2)
+            cost, _, expanded = skeleton_search(hierarchy, start_link, end_link)
+            ch_cost, route, ch_expanded = ch_search(hierarchy, start_link, end_link)
+            self.assertEqual(ch_cost, cost)
+            if cost is not None:
+                self.assertEqual(sum(abs(b - a) for _, a, b in route), cost)
+                self.assertLess(ch_expanded, expanded)
+
+        labels = build_components(binary_image)["labels"]
+        largest = np.argmax(np.bincount(labels.ravel())[1:]) + 1
+        free = [tuple(p) for p in np.argwhere(labels == largest).tolist()]
+        for start, end in zip(free[::97], free[::-89]):
+            path = find_path(binary_image, start, end, "ch", hierarchy=hierarchy)
+            assert_valid_path(self, binary_image, path, start, end)
+
+    def test_components_reject_unreachable_pairs(self):
+        binary_image = np.full((10, 10), 255, dtype=np.uint8)
+        binary_image[:, 5] = 0
+        binary_image[0, 0] = 0
+        components = unpack_arrays(pack_arrays(build_components(binary_image)))
+
+        self.assertEqual(components["labels"].dtype, np.uint16)
+        self.assertEqual(int(components["count"][0]), 2)
+        labels, error = check_components(components, (1, 0), (9, 4))
+        self.assertIsNone(error)
+        self.assertEqual(labels["start"], labels["end"])
+        labels, error = check_components(components, (1, 0), (0, 9))
+        self.assertEqual(error[1], 404)
+        self.assertNotEqual(labels["start"], labels["end"])
+        for wall in ((0, 0), (0, 5), (10, 3)):
+            _, error = check_components(components, wall, (9, 9))
+            self.assertEqual(error[1], 400)
+
+    def test_snap_to_nearest_walkable(self):
+        binary_image = np.zeros((30, 40), dtype=np.uint8)
+        binary_image[10:20, 25:35] = 255
+        snap_index = unpack_arrays(pack_arrays(build_snap_index(binary_image)))
+
+        self.assertEqual(snap_point(snap_index, (12, 30)), ((12, 30), 0.0))
+        self.assertEqual(snap_point(snap_index, (15, 20)), ((15, 25), 5.0))
+        self.assertEqual(snap_point(snap_index, (0, 30), max_radius=10)[0], (10, 30))
+        self.assertIsNone(snap_point(snap_index, (15, 0), max_radius=10))
+        self.assertIsNone(snap_point(snap_index, (30, 30)))
+
+        empty = build_snap_index(np.zeros((5, 5), dtype=np.uint8))
+        self.assertIsNone(snap_point(empty, (2, 2)))
+
+    def test_shortest_path_tree_yields_nearest_first(self):
+        binary_image = random_floor(60, 80, seed=4)
+        start, _ = first_reachable_pair(binary_image)
+        free = [tuple(p) for p in np.argwhere(binary_image == 255).tolist()]
+        targets = free[::97] + [(0, 100)]
+
+        results = list(
+            shortest_path_tree(binary_image, start, targets, with_paths=True)
+        )
+        distances = [distance for _, distance, _ in results]
+        self.assertEqual(distances, sorted(distances))
+        for point, distance, path in results:
+            self.assertEqual(
+                len(find_path(binary_image, start, point, "bfs")), distance + 1
+            )
+            assert_valid_path(self, binary_image, path, start, point)
+        reached = {point for point, _, _ in results}
+        for point in set(targets) - reached:
+            with self.assertRaises(nx.NetworkXException):
+                find_path(binary_image, start, point, "bfs")
+
+    def test_anchor_matrix_next_hops(self):
+        # Three rooms in a row joined by doors, plus a closed room
+        binary_image = np.full((20, 60), 255, dtype=np.uint8)
+        binary_image[:, [20, 40]] = 0
+        binary_image[10, [20, 40]] = 255
+        binary_image[:, 50] = 0
+        anchors = [(10, 5), (10, 30), (10, 45), (5, 55), None, (10, 30)]
+        matrix = unpack_arrays(pack_arrays(build_anchor_matrix(binary_image, anchors)))
+
+        distances = matrix["distances"]
+        self.assertTrue(np.array_equal(distances, distances.T))
+        self.assertEqual(distances[0, 2], 40)
+        self.assertEqual(distances[0, 3], -1)
+        self.assertEqual(distances[4, 4], -1)
+        self.assertEqual(distances[1, 5], 0)
+        self.assertEqual(anchor_route(matrix, 0, 2), (40, [0, 1, 2]))
+        self.assertEqual(anchor_route(matrix, 2, 0), (40, [2, 1, 0]))
+        self.assertEqual(anchor_route(matrix, 0, 1), (25, [0, 1]))
+        self.assertEqual(anchor_route(matrix, 0, 5), (25, [0, 1, 5]))
+        self.assertEqual(anchor_route(matrix, 0, 3), (None, []))
+
+    def test_binary_image_packing_round_trip(self):
+        binary_image = random_floor(37, 53)
+        packed, shape = encode_binary_image(binary_image)
+        self.assertEqual(shape, [37, 53])
+        self.assertEqual(len(packed), -(-37 * 53 // 8))
+        np.testing.assert_array_equal(decode_binary_image(packed, shape), binary_image)
+
+    def test_polyline_simplify_and_round_trip(self):
+        binary_image = np.full((60, 60), 255, dtype=np.uint8)
+        binary_image[10:50, 30] = 0
+        path = find_path(binary_image, (30, 2), (30, 58), "grid")
+        corners = collapse_collinear(path)
+        self.assertLess(len(corners), len(path))
+        simplified = simplify_path(path, tolerance=1.0)
+        self.assertEqual(simplified[0].tolist(), [30, 2])
+        self.assertEqual(simplified[-1].tolist(), [30, 58])
+        self.assertLessEqual(len(simplified), len(corners))
+
+        points = [[0, 0], [1000, 2000], [-5, 3], [-5, 3], [0, 0]]
+        self.assertEqual(decode_polyline(encode_polyline(points)), points)
+        self.assertEqual(
+            collapse_collinear([(0, i) for i in range(50)]).tolist(), [[0, 0], [0, 49]]
+        )
+
+    def test_path_overlay_is_cropped_to_route(self):
+        path = [(10, 20), (10, 40), (30, 40)]
+        frame = visualize_path(np.zeros((50, 60, 3), dtype=np.uint8), path)
+        self.assertEqual(frame[10, 30].tolist(), [0, 0, 255])
+
+        overlay = path_overlay(path, "png")
+        self.assertEqual(overlay["offset"], [7, 17])
+        self.assertEqual(overlay["size"], [27, 27])
+        png = cv2.imdecode(
+            np.frombuffer(base64.b64decode(overlay["data"]), dtype=np.uint8),
+            cv2.IMREAD_UNCHANGED,
+        )
+        self.assertEqual(png.shape, (27, 27, 4))
+        self.assertEqual(png[0, 0, 3], 0)
+        self.assertEqual(png[3, 13].tolist(), [0, 0, 255, 255])
+        self.assertIn('points="3,3 23,3 23,23"', path_overlay(path, "svg")["data"])
+
+    def test_tile_pyramid_and_path_tiles(self):
+        self.assertEqual(
+            pyramid_levels(1000, 300, tile_size=256),
+            [(1000, 300), (500, 150), (250, 75)],
+        )
+        frame = np.random.default_rng(0).integers(0, 255, (300, 500, 3), np.uint8)
+        tiles = list(image_tiles(frame, tile_size=256))
+        self.assertEqual(len(tiles), 4 + 1)
+        self.assertEqual(tiles[1][3].shape, (256, 244, 3))
+
+        path = [(20, 20), (20, 300), (280, 300)]
+        crossed = path_tiles(path, tile_size=256, shape=frame.shape)
+        self.assertEqual(crossed, [(0, 0), (0, 1), (1, 1)])
+        drawn = visualize_path(frame, path)
+        for row, col in crossed:
+            segments = tile_segments(path, row, col, tile_size=256)
+            tile = render_path_tile(frame, segments, row, col, tile_size=256)
+            np.testing.assert_array_equal(
+                tile, drawn[row * 256 : (row + 1) * 256, col * 256 : (col + 1) * 256]
+            )
+        np.testing.assert_array_equal(drawn[256:, :256], frame[256:, :256])
+
+    def test_extract_edges(self):
+        binary_image = np.array([[255, 255, 0], [0, 255, 255]], dtype=np.uint8)
+        edges = extract_edges(binary_image)
+        self.assertEqual(
+            sorted(map(tuple, edges.tolist())),
+            [
+                (0, 0, 0, 1),
+                (0, 1, 0, 0),
+                (0, 1, 1, 1),
+                (1, 1, 0, 1),
+                (1, 1, 1, 2),
+                (1, 2, 1, 1),
+            ],
+        )
+        graph = create_graph_origin(binary_image)
+        self.assertEqual(graph.number_of_edges(), 3)
+        self.assertEqual(graph[(0, 0)][(0, 1)]["weight"], 1)
+
+    def test_unknown_engine(self):
+        binary_image = np.full((3, 3), 255, dtype=np.uint8)
+        with self.assertRaises(ValueError):
+            find_path(binary_image, (0, 0), (2, 2), "dijkstra")
+
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore")
+    unittest.main(verbosity=2)
@@ -0,0 +1,101 @@
+"""Move legacy per-image arrays out of Image documents.
+
+Nested binary_image lists are re-encoded as bit-packed binary_packed, and
+raw image_binary frames move to PNG files in GridFS (image_file). Duplicate
+Roboflow anchors are removed so the unique (image, detectionId) index can be
+built.
+
+Usage: python -m utils.migrate_binary_images [--dry-run]
+"""
+
+import sys
+
+import cv2
+import numpy as np
+from bson import Binary
+from models import Image, Anchor
+from pathCalculator.image_processing import encode_binary_image
+
+# Documents still holding the legacy list (empty lists are skipped)
+LEGACY = {"binary_image.0": {"$exists": True}}
+LEGACY_FRAMES = {"image_binary": {"$exists": True, "$ne": None}}
+# Anchors sharing an image and detectionId, oldest first
+DUPLICATE_ANCHORS = [
+    {"$match": {"detectionId": {"$type": "string"}}},
+    {"$sort": {"_id": 1}},
+    {
+        "$group": {
+            "_id": {"image": "$image", "detectionId": "$detectionId"},
+            "ids": {"$push": "$_id"},
+        }
+    },
+    {"$match": {"ids.1": {"$exists": True}}},
+]
+
+
+def migrate(dry_run=False):
+    migrated = 0
+    for image_id in Image.objects(__raw__=LEGACY).scalar("id"):
+        # One document at a time: each list can be tens of megabytes
+        image_doc = Image.objects(id=image_id).only("binary_image").first()
+        binary_image = np.array(image_doc.binary_image, dtype=np.uint8)
+        binary_packed, binary_shape = encode_binary_image(binary_image)
+        print(f"{image_id}: {binary_shape} -> {len(binary_packed)} bytes")
+        if not dry_run:
+            # updatedAt is kept: the map itself does not change
+            image_doc.update(
+                set__binary_packed=Binary(binary_packed),
+                set__binary_shape=binary_shape,
+                unset__binary_image=True,
+            )
+        migrated += 1
+    return migrated
+
+
+def migrate_frames(dry_run=False):
+    migrated = 0
+    for image_id in Image.objects(__raw__=LEGACY_FRAMES).scalar("id"):
+        image_doc = (
+            Image.objects(id=image_id).only("image_binary", "image_shape").first()
+        )
+        image = np.frombuffer(image_doc.image_binary, dtype=np.uint8)
+        _, image_png = cv2.imencode(".png", image.reshape(image_doc.image_shape))
+        print(f"{image_id}: {image.size} -> {image_png.size} bytes")
+        if not dry_run:
+            image_doc.image_file.put(image_png.tobytes(), content_type="image/png")
+            # Raw update: keyword updates cannot set a FileField
+            image_doc.update(
+                __raw__={
+                    "$set": {"image_file": image_doc.image_file.grid_id},
+                    "$unset": {"image_binary": ""},
+                }
+            )
+        migrated += 1
+    return migrated
+
+
+def dedupe_anchors(dry_run=False):
+    # The raw collection: Anchor._get_collection() would try to build the
+    # unique index the duplicates still block
+    collection = Anchor._get_db()[Anchor._get_collection_name()]
+    removed = 0
+    for group in collection.aggregate(DUPLICATE_ANCHORS):
+        duplicates = group["ids"][1:]
+        print(f"{group['_id']}: {len(duplicates)} duplicates")
+        if not dry_run:
+            collection.delete_many({"_id": {"$in": duplicates}})
+        removed += len(duplicates)
+    if not dry_run:
+        Anchor.ensure_indexes()
+    return removed
+
+
+if __name__ == "__main__":
+    import main  # noqa: F401  connects to MongoDB like the web app
+
+    dry_run = "--dry-run" in sys.argv[1:]
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"{verb} {migrate(dry_run=dry_run)} binary images")
+    print(f"{verb} {migrate_frames(dry_run=dry_run)} image frames")
+    removed = "Would remove" if dry_run else "Removed"
+    print(f"{removed} {dedupe_anchors(dry_run=dry_run)} duplicate anchors")